@@ -0,0 +1,388 @@
+import os
+import json
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+import pandas as pd
+
+# Доля max_size, до которой LLM_Cache сокращается при переполнении (старые
+# записи удаляются пачкой, а не по одной при каждой вставке)
+LLM_CACHE_EVICT_TO = 0.9
+
+
+class Corpus_Cache:
+    '''Кеш подготовленного корпуса на диске. Результаты подготовки текста
+    (prepare_chunk и light_prepare_chunk) и эмбеддинги хранятся по пачкам
+    в формате parquet. Ключ кеша вычисляется по содержимому файла
+    документов, версии обработчика текста, модели эмбеддингов и параметрам
+    загрузки, поэтому изменение любого из них даёт новый ключ.'''
+    def __init__(self, cache_dir: str):
+        '''Функция инициализации.
+
+        Args:
+            cache_dir: папка, в которой хранится кеш.'''
+        self.cache_dir = cache_dir
+
+    def make_key(self, **parts) -> str:
+        '''Вычисление ключа кеша.
+
+        Args:
+            parts: всё, от чего зависит результат подготовки корпуса
+            (хеш файла, версия обработчика, модель эмбеддингов и т.д.).
+
+        Returns:
+            str: ключ кеша.'''
+        content = json.dumps(parts, ensure_ascii=False, sort_keys=True)
+        return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+    def num_of_chunks(self, key: str) -> int | None:
+        '''Количество пачек в полностью сохранённом корпусе.
+
+        Args:
+            key: ключ кеша.
+
+        Returns:
+            int | None: количество пачек или None, если корпус сохранён не
+            полностью.'''
+        complete_path = os.path.join(self.cache_dir, key, "complete.json")
+        if not os.path.exists(complete_path):
+            return None
+        with open(complete_path, encoding="utf-8") as file:
+            return json.load(file)["num_of_chunks"]
+
+    def mark_complete(self, key: str, num_of_chunks: int) -> None:
+        '''Отмечает корпус как полностью сохранённый, если все его пачки
+        есть в кеше.
+
+        Args:
+            key: ключ кеша.
+            num_of_chunks: количество пачек в корпусе.'''
+        if all(
+            os.path.exists(self.__chunk_path__(key, num_of_chunk))
+            for num_of_chunk in range(num_of_chunks)
+        ):
+            with open(os.path.join(self.cache_dir, key, "complete.json"), "w", encoding="utf-8") as file:
+                json.dump({"num_of_chunks": num_of_chunks}, file)
+
+    def load_chunk(
+        self, key: str, num_of_chunk: int
+    ) -> tuple[pd.DataFrame, pd.DataFrame, list[list[float]], list[list[float]]] | None:
+        '''Чтение пачки из кеша.
+
+        Args:
+            key: ключ кеша.
+            num_of_chunk: номер пачки.
+
+        Returns:
+            (docs, true_docs, true_embeddings, embeddings): подготовленная
+            пачка, пачка после облегчённой подготовки и эмбеддинги их
+            содержимого или None, если пачки нет в кеше.'''
+        path = self.__chunk_path__(key, num_of_chunk)
+        if not os.path.exists(path):
+            return None
+
+        data = pd.read_parquet(path)
+        true_columns = [column for column in data.columns if column.startswith("true_")]
+        columns = [column[len("true_"):] for column in true_columns]
+
+        docs = data[columns].reset_index(drop=True)
+        true_docs = data[true_columns].set_axis(columns, axis=1).reset_index(drop=True)
+        true_embeddings = [vector.tolist() for vector in data["embedding_true"]]
+        embeddings = [vector.tolist() for vector in data["embedding_processed"]]
+
+        return docs, true_docs, true_embeddings, embeddings
+
+    def save_chunk(
+        self, key: str, num_of_chunk: int, docs: pd.DataFrame, true_docs: pd.DataFrame,
+        true_embeddings: list[list[float]], embeddings: list[list[float]]
+    ) -> None:
+        '''Сохранение пачки в кеш.
+
+        Args:
+            key: ключ кеша.
+            num_of_chunk: номер пачки.
+            docs: подготовленная пачка документов.
+            true_docs: та же пачка после облегчённой подготовки.
+            true_embeddings: эмбеддинги содержимого true_docs.
+            embeddings: эмбеддинги содержимого docs.'''
+        os.makedirs(os.path.join(self.cache_dir, key), exist_ok=True)
+
+        data = pd.concat([docs, true_docs.add_prefix("true_")], axis=1)
+        data["embedding_true"] = true_embeddings
+        data["embedding_processed"] = embeddings
+
+        path = self.__chunk_path__(key, num_of_chunk)
+        data.to_parquet(f"{path}.tmp", index=False)
+        os.replace(f"{path}.tmp", path)
+
+    def __chunk_path__(self, key: str, num_of_chunk: int) -> str:
+        '''Путь к файлу пачки.
+
+        Args:
+            key: ключ кеша.
+            num_of_chunk: номер пачки.
+
+        Returns:
+            str: путь к parquet файлу пачки.'''
+        return os.path.join(self.cache_dir, key, f"chunk_{num_of_chunk:06d}.parquet")
+
+
+class LRU_Cache:
+    '''Ограниченный по размеру кеш в памяти с вытеснением давно не
+    использовавшихся записей и счётчиками попаданий и промахов. Содержимое
+    можно сохранить в json файл и загрузить при следующем запуске.'''
+    def __init__(self, max_size: int, path: str | None = None):
+        '''Функция инициализации.
+
+        Args:
+            max_size: максимальное количество записей.
+            path: json файл для сохранения кеша между запусками (если файл
+            уже есть, кеш заполняется из него).'''
+        self.max_size = max_size
+        self.path = path
+        self.data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+        if path and os.path.exists(path):
+            with open(path, encoding="utf-8") as file:
+                for key, value in json.load(file):
+                    self.put(key, value)
+
+    def __len__(self) -> int:
+        '''Количество записей в кеше.'''
+        return len(self.data)
+
+    def get(self, key):
+        '''Получение значения по ключу.
+
+        Args:
+            key: ключ.
+
+        Returns:
+            значение или None, если ключа нет в кеше.'''
+        with self.lock:
+            if key not in self.data:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.data.move_to_end(key)
+            return self.data[key]
+
+    def put(self, key, value) -> None:
+        '''Добавление значения в кеш.
+
+        Args:
+            key: ключ.
+            value: значение.'''
+        with self.lock:
+            self.data[key] = value
+            self.data.move_to_end(key)
+            while len(self.data) > self.max_size:
+                self.data.popitem(last=False)
+
+    def stats(self) -> dict:
+        '''Статистика использования кеша.
+
+        Returns:
+            dict: количество записей, попаданий и промахов.'''
+        return {"size": len(self.data), "hits": self.hits, "misses": self.misses}
+
+    def save(self) -> None:
+        '''Сохранение кеша в json файл (если он задан).'''
+        if not self.path:
+            return
+        with self.lock:
+            items = list(self.data.items())
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump(items, file, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+
+class Result_Cache:
+    '''Кеш результатов поиска с ограничением по размеру и времени жизни
+    записей. Каждая запись помнит индексы, по которым выполнялся поиск:
+    запись в любой из них (invalidate) удаляет зависящие от него
+    результаты.
+
+    Кеш хранится в памяти процесса, поэтому invalidate видит только записи,
+    сделанные в этом же процессе. Изменения индексов из других процессов
+    становятся видны не позже чем через ttl.'''
+    def __init__(self, max_size: int, ttl: float):
+        '''Функция инициализации.
+
+        Args:
+            max_size: максимальное количество записей (0 - кеш выключен).
+            ttl: время жизни записи в секундах.'''
+        self.max_size = max_size
+        self.ttl = ttl
+        self.data = OrderedDict()
+        self.generations = {}
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def generation(self, indices_names: list[str]) -> tuple:
+        '''Номера версий индексов. Запоминаются перед поиском и передаются
+        в put, чтобы не сохранить результат, устаревший из-за записи в индекс
+        во время поиска.
+
+        Args:
+            indices_names: наименования индексов.
+
+        Returns:
+            tuple: номера версий индексов.'''
+        with self.lock:
+            return tuple(self.generations.get(index_name, 0) for index_name in indices_names)
+
+    def get(self, key):
+        '''Получение результата по ключу.
+
+        Args:
+            key: ключ (параметры поиска).
+
+        Returns:
+            результат или None, если его нет в кеше или он устарел.'''
+        with self.lock:
+            entry = self.data.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                self.data.pop(key, None)
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.data.move_to_end(key)
+            return entry[2]
+
+    def put(self, key, indices_names: list[str], value, generation: tuple) -> None:
+        '''Сохранение результата поиска.
+
+        Args:
+            key: ключ (параметры поиска).
+            indices_names: индексы, по которым выполнялся поиск.
+            value: результат.
+            generation: версии индексов до начала поиска (generation).'''
+        with self.lock:
+            current = tuple(self.generations.get(index_name, 0) for index_name in indices_names)
+            if self.max_size <= 0 or current != generation:
+                return
+            self.data[key] = (time.monotonic() + self.ttl, frozenset(indices_names), value)
+            self.data.move_to_end(key)
+            while len(self.data) > self.max_size:
+                self.data.popitem(last=False)
+
+    def invalidate(self, indices_names: list[str]) -> None:
+        '''Удаление результатов, полученных по указанным индексам.
+
+        Args:
+            indices_names: индексы, в которые были записаны изменения.'''
+        with self.lock:
+            for index_name in indices_names:
+                self.generations[index_name] = self.generations.get(index_name, 0) + 1
+            changed = set(indices_names)
+            for key in [key for key, entry in self.data.items() if entry[1] & changed]:
+                del self.data[key]
+
+    def stats(self) -> dict:
+        '''Статистика использования кеша.
+
+        Returns:
+            dict: количество записей, попаданий и промахов.'''
+        return {"size": len(self.data), "hits": self.hits, "misses": self.misses}
+
+
+class LLM_Cache:
+    '''Кеш ответов YandexGPT на диске (sqlite). Ключ - хеш промпта, текста
+    документа и нормализованного вопроса. Сохраняются и ответы "0" (в
+    документе нет ответа), чтобы повторный запрос не отправлялся совсем.
+    При превышении размера удаляются давно не использовавшиеся записи:
+    количество записей отслеживается в памяти, и кеш сокращается сразу до
+    LLM_CACHE_EVICT_TO от max_size, поэтому вставка не считает строки
+    таблицы.'''
+    def __init__(self, path: str, max_size: int):
+        '''Функция инициализации. Открывает кеш или создаёт новый.
+
+        Args:
+            path: путь к файлу базы sqlite.
+            max_size: максимальное количество записей.'''
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        with self.lock, self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS answers (key TEXT PRIMARY KEY, answer TEXT, used REAL)"
+            )
+            self.connection.execute("CREATE INDEX IF NOT EXISTS answers_used ON answers (used)")
+            self.size = self.connection.execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+
+    def make_key(self, prompt: str, document: str, question: str) -> str:
+        '''Вычисление ключа кеша.
+
+        Args:
+            prompt: системный промпт.
+            document: текст документа.
+            question: вопрос (регистр и лишние пробелы не учитываются).
+
+        Returns:
+            str: ключ кеша.'''
+        question = " ".join(question.lower().split())
+        content = json.dumps([prompt, document, question], ensure_ascii=False)
+        return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> str | None:
+        '''Получение ответа по ключу.
+
+        Args:
+            key: ключ кеша.
+
+        Returns:
+            str | None: ответ или None, если его нет в кеше.'''
+        with self.lock, self.connection:
+            row = self.connection.execute("SELECT answer FROM answers WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.connection.execute("UPDATE answers SET used = ? WHERE key = ?", (time.time(), key))
+            return row[0]
+
+    def put(self, key: str, answer: str) -> None:
+        '''Сохранение ответа.
+
+        Args:
+            key: ключ кеша.
+            answer: ответ.'''
+        with self.lock, self.connection:
+            inserted = self.connection.execute(
+                "INSERT OR IGNORE INTO answers (key, answer, used) VALUES (?, ?, ?)",
+                (key, answer, time.time())
+            ).rowcount
+            if not inserted:
+                self.connection.execute(
+                    "UPDATE answers SET answer = ?, used = ? WHERE key = ?",
+                    (answer, time.time(), key)
+                )
+            self.size += inserted
+
+            if self.size > self.max_size:
+                self.size -= self.connection.execute(
+                    "DELETE FROM answers WHERE key IN (SELECT key FROM answers ORDER BY used LIMIT ?)",
+                    (self.size - int(self.max_size * LLM_CACHE_EVICT_TO),)
+                ).rowcount
+
+    def stats(self) -> dict:
+        '''Статистика использования кеша.
+
+        Returns:
+            dict: количество записей, попаданий и промахов.'''
+        return {"size": self.size, "hits": self.hits, "misses": self.misses}
+
+    def close(self) -> None:
+        '''Закрытие базы.'''
+        with self.lock:
+            self.connection.close()
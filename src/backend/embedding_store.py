@@ -0,0 +1,246 @@
+import os
+import json
+import numpy as np
+
+# Размер sha1 хеша в байтах
+HASH_SIZE = 20
+# Тип элементов отсортированного индекса хешей (хеш как строка байтов)
+HASH_DTYPE = f"S{HASH_SIZE}"
+
+
+class Embedding_Store:
+    '''Хранилище эмбеддингов на диске. Векторы лежат в одной матрице
+    (float32 или float16), отображаемой в память (numpy.memmap), рядом
+    хранятся хеши текстов, которым соответствуют строки матрицы.
+
+    Открытие хранилища не зависит от его размера: читается только
+    небольшой файл с описанием, а матрица подгружается операционной
+    системой по мере обращения к строкам. Для поиска рядом хранится
+    отсортированный индекс хешей (index_keys.bin и index_rows.bin - номера
+    строк матрицы), который тоже отображается в память: хеши ищутся
+    двоичным поиском (np.searchsorted), поэтому ни открытие хранилища, ни
+    первый поиск не читают все хеши.'''
+    def __init__(self, path: str, dim: int, model_name: str, dtype: str = "float32"):
+        '''Функция инициализации. Открывает хранилище или создаёт новое.
+
+        Args:
+            path: папка хранилища.
+            dim: размерность эмбеддингов.
+            model_name: модель, которой вычислены эмбеддинги (хранилище
+            другой модели открыть нельзя).
+            dtype: тип элементов матрицы: float32 или float16.'''
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+        meta_path = os.path.join(path, "meta.json")
+        if os.path.exists(meta_path):
+            with open(meta_path, encoding="utf-8") as file:
+                self.meta = json.load(file)
+            if self.meta["model_name"] != model_name or self.meta["dim"] != dim:
+                raise ValueError(
+                    f"Хранилище {path} содержит эмбеддинги модели {self.meta['model_name']} размерности {self.meta['dim']}"
+                )
+        else:
+            self.meta = {
+                "model_name": model_name,
+                "dim": dim,
+                "dtype": dtype,
+                "size": 0,
+                "capacity": 0
+            }
+
+        self.__open__()
+        self.__open_index__()
+
+    def __len__(self) -> int:
+        '''Количество эмбеддингов в хранилище.'''
+        return self.meta["size"]
+
+    def get(self, hashes: list[str]) -> list[np.ndarray | None]:
+        '''Поиск эмбеддингов по хешам текстов.
+
+        Args:
+            hashes: sha1 хеши текстов (в шестнадцатеричном виде).
+
+        Returns:
+            list[np.ndarray | None]: эмбеддинги (float32) или None для
+            хешей, которых нет в хранилище.'''
+        return [
+            np.array(self.vectors[row], dtype=np.float32) if row >= 0 else None
+            for row in self.__find_rows__(hashes)
+        ]
+
+    def append(self, hashes: list[str], vectors) -> None:
+        '''Добавление эмбеддингов в конец хранилища. Уже сохранённые хеши
+        пропускаются.
+
+        Args:
+            hashes: sha1 хеши текстов (в шестнадцатеричном виде).
+            vectors: эмбеддинги (по одному на хеш).'''
+        new_rows = {}
+        for text_hash, vector, row in zip(hashes, vectors, self.__find_rows__(hashes)):
+            if row < 0 and text_hash not in new_rows:
+                new_rows[text_hash] = vector
+        if not new_rows:
+            return
+
+        size = self.meta["size"]
+        new_size = size + len(new_rows)
+        if new_size > self.meta["capacity"]:
+            self.__resize__(max(new_size, 2 * self.meta["capacity"], 1024))
+
+        new_keys = self.__to_keys__(list(new_rows))
+        self.vectors[size:new_size] = np.asarray(list(new_rows.values()), dtype=self.meta["dtype"])
+        self.keys[size:new_size] = new_keys.view(np.uint8).reshape(-1, HASH_SIZE)
+
+        # Новые хеши вставляются в отсортированный индекс слиянием
+        order = np.argsort(new_keys, kind="stable")
+        positions = np.searchsorted(self.index_keys, new_keys[order])
+        self.__save_index__(
+            np.insert(self.index_keys, positions, new_keys[order]),
+            np.insert(self.index_rows, positions, np.arange(size, new_size, dtype=np.int64)[order])
+        )
+
+        self.meta["size"] = new_size
+        self.flush()
+
+    def compact(self, keep_hashes: set[str]) -> None:
+        '''Удаление из хранилища эмбеддингов, хеши которых не входят в
+        keep_hashes, и освобождение места на диске.
+
+        Args:
+            keep_hashes: хеши текстов, эмбеддинги которых нужно оставить.'''
+        rows = np.sort(self.__find_rows__(list(keep_hashes)))
+        rows = rows[rows >= 0]
+
+        vectors = np.array(self.vectors[rows])
+        keys = np.array(self.keys[rows])
+
+        self.meta["size"] = len(rows)
+        self.__resize__(len(rows))
+        self.vectors[:len(rows)] = vectors
+        self.keys[:len(rows)] = keys
+        self.__save_index__(*self.__build_index__())
+        self.flush()
+
+    def flush(self) -> None:
+        '''Запись изменений на диск.'''
+        if self.meta["capacity"]:
+            self.vectors.flush()
+            self.keys.flush()
+
+        tmp_path = os.path.join(self.path, "meta.json.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump(self.meta, file)
+        os.replace(tmp_path, os.path.join(self.path, "meta.json"))
+
+    def __open__(self) -> None:
+        '''Отображение файлов матрицы и хешей в память.'''
+        capacity = self.meta["capacity"]
+        if capacity == 0:
+            self.vectors = np.zeros((0, self.meta["dim"]), dtype=self.meta["dtype"])
+            self.keys = np.zeros((0, HASH_SIZE), dtype=np.uint8)
+            return
+
+        self.vectors = np.memmap(
+            os.path.join(self.path, "vectors.bin"),
+            dtype=self.meta["dtype"],
+            mode="r+",
+            shape=(capacity, self.meta["dim"])
+        )
+        self.keys = np.memmap(
+            os.path.join(self.path, "keys.bin"),
+            dtype=np.uint8,
+            mode="r+",
+            shape=(capacity, HASH_SIZE)
+        )
+
+    def __resize__(self, capacity: int) -> None:
+        '''Изменение размера файлов матрицы и хешей без копирования данных.
+
+        Args:
+            capacity: новое количество строк.'''
+        self.vectors = None
+        self.keys = None
+        row_size = self.meta["dim"] * np.dtype(self.meta["dtype"]).itemsize
+        for name, size in (("vectors.bin", capacity * row_size), ("keys.bin", capacity * HASH_SIZE)):
+            with open(os.path.join(self.path, name), "ab") as file:
+                file.truncate(size)
+
+        self.meta["capacity"] = capacity
+        self.__open__()
+
+    def __to_keys__(self, hashes: list[str]) -> np.ndarray:
+        '''Перевод хешей из шестнадцатеричного вида в элементы индекса.
+
+        Args:
+            hashes: sha1 хеши текстов (в шестнадцатеричном виде).
+
+        Returns:
+            np.ndarray: хеши в виде строк байтов.'''
+        return np.frombuffer(bytes.fromhex("".join(hashes)), dtype=HASH_DTYPE)
+
+    def __find_rows__(self, hashes: list[str]) -> np.ndarray:
+        '''Поиск строк матрицы по хешам двоичным поиском в индексе.
+
+        Args:
+            hashes: sha1 хеши текстов (в шестнадцатеричном виде).
+
+        Returns:
+            np.ndarray: номера строк (-1 для хешей, которых нет в хранилище).'''
+        keys = self.__to_keys__(hashes)
+        rows = np.full(len(keys), -1, dtype=np.int64)
+        if len(keys) == 0 or len(self.index_keys) == 0:
+            return rows
+
+        positions = np.minimum(np.searchsorted(self.index_keys, keys), len(self.index_keys) - 1)
+        found = self.index_keys[positions] == keys
+        rows[found] = self.index_rows[positions[found]]
+
+        return rows
+
+    def __build_index__(self) -> (np.ndarray, np.ndarray):
+        '''Построение отсортированного индекса по всем хешам хранилища.
+
+        Returns:
+            (np.ndarray, np.ndarray): отсортированные хеши и номера их строк.'''
+        keys = np.array(self.keys[:self.meta["size"]]).view(HASH_DTYPE).reshape(-1)
+        rows = np.argsort(keys, kind="stable").astype(np.int64)
+
+        return keys[rows], rows
+
+    def __open_index__(self) -> None:
+        '''Отображение файлов индекса в память. Если индекса нет или он не
+        соответствует описанию хранилища (хранилище создано до появления
+        индекса или запись была прервана), индекс строится заново.'''
+        size = self.meta["size"]
+        keys_path = os.path.join(self.path, "index_keys.bin")
+        rows_path = os.path.join(self.path, "index_rows.bin")
+        if size == 0:
+            self.index_keys = np.zeros(0, dtype=HASH_DTYPE)
+            self.index_rows = np.zeros(0, dtype=np.int64)
+            return
+        if (
+            not os.path.exists(keys_path) or not os.path.exists(rows_path)
+            or os.path.getsize(keys_path) != size * HASH_SIZE
+            or os.path.getsize(rows_path) != size * np.dtype(np.int64).itemsize
+        ):
+            self.__save_index__(*self.__build_index__())
+            return
+
+        self.index_keys = np.memmap(keys_path, dtype=HASH_DTYPE, mode="r", shape=(size,))
+        self.index_rows = np.memmap(rows_path, dtype=np.int64, mode="r", shape=(size,))
+
+    def __save_index__(self, index_keys: np.ndarray, index_rows: np.ndarray) -> None:
+        '''Атомарная запись индекса на диск.
+
+        Args:
+            index_keys: отсортированные хеши.
+            index_rows: номера строк матрицы для каждого хеша.'''
+        self.index_keys = np.asarray(index_keys, dtype=HASH_DTYPE)
+        self.index_rows = np.asarray(index_rows, dtype=np.int64)
+        for name, data in (("index_keys.bin", self.index_keys), ("index_rows.bin", self.index_rows)):
+            tmp_path = os.path.join(self.path, f"{name}.tmp")
+            with open(tmp_path, "wb") as file:
+                file.write(data.tobytes())
+            os.replace(tmp_path, os.path.join(self.path, name))
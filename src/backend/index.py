@@ -1,23 +1,117 @@
 from src.backend.processing_text import Prepare_Text
-from elasticsearch import Elasticsearch
+from src.backend.reader import read_docs_chunks, file_hash
+from src.backend.cache import Corpus_Cache, LRU_Cache, Result_Cache, LLM_Cache
+from src.backend.embedding_store import Embedding_Store
+from src.backend.prefix_index import Prefix_Index
+from elasticsearch import Elasticsearch, helpers
 import re
-from src.backend.short_answer import get_short_answer
-import asyncio
+from src.backend import short_answer
+from src.backend.short_answer import get_short_answer, get_short_answer_stream, get_short_answers
+import hashlib
+import json
+import os
+import time
 from sentence_transformers import SentenceTransformer
+import pandas as pd
+
+EMBEDDING_MODEL_NAME = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
+# Способы формирования краткого ответа (см. My_search.__get_answer__)
+ANSWER_MODES = ["per_document", "packed"]
+# Оценка количества токенов YandexGPT на одно слово (для русского текста с
+# запасом) при упаковке документов в режиме packed
+TOKENS_PER_WORD = 2
+# Гарантированная доля бюджета каждого документа в режиме packed (от равной
+# доли), остальной бюджет отдаётся документам по убыванию релевантности
+CONTEXT_FLOOR_SHARE = 0.25
+# Поля документа, которые нужны для вывода поисковой выдачи
+DOCUMENT_FIELDS = ["doc_id", "url", "true_summary", "summary"]
 
 
 class My_search:
     '''Класс для работы с Elasticsearch: создание индексов и работа с ними:
     вставка, удаление, поиск.'''
-    def __init__(self, host: str):
+    def __init__(
+        self, host: str, n_process: int = 1, lean: bool = False,
+        lemma_cache_size: int = 0, lemma_dictionary_path: str | None = None,
+        lemma_dictionary_read_only: bool = False, corpus_cache_dir: str | None = None, embedding_store_path: str | None = None,
+        query_cache_size: int = 1024, query_cache_path: str | None = None,
+        result_cache_size: int = 256, result_cache_ttl: float = 300.0,
+        llm_concurrency: int = 4, llm_cache_path: str | None = None,
+        llm_cache_size: int = 100000, answer_mode: str = "per_document",
+        context_token_budget: int = 3000
+    ):
         '''Функция инициализации. Подключаемся к
         Elasticsearch и создаём класс обработчик текста.
 
         Args:
-            host: http ссылка на Elasticsearch.'''
+            host: http ссылка на Elasticsearch.
+            n_process: количество процессов для лемматизации документов
+            при загрузке.
+            lean: облегчённый режим языковых пакетов SpaCy (ленивая
+            загрузка, только компоненты для лемматизации).
+            lemma_cache_size: размер LRU кеша лемм в памяти.
+            lemma_dictionary_path: путь к словарю лемм на диске, общему для
+            загрузки документов и обработки запросов.
+            lemma_dictionary_read_only: открыть словарь лемм только для
+            чтения (для обработки запросов, пока словарь может пополняться
+            загрузкой документов в другом процессе).
+            corpus_cache_dir: папка кеша подготовленного корпуса (None - без
+            кеша). С кешем повторная загрузка того же файла пропускает
+            лемматизацию и вычисление эмбеддингов.
+            embedding_store_path: папка хранилища эмбеддингов на диске (None -
+            без хранилища). Эмбеддинги уже встречавшихся текстов берутся из
+            хранилища, а не вычисляются моделью.
+            query_cache_size: размер кеша эмбеддингов запросов.
+            query_cache_path: json файл, в котором кеш эмбеддингов запросов
+            сохраняется между запусками (None - не сохранять).
+            result_cache_size: размер кеша результатов поиска (0 - без кеша).
+            result_cache_ttl: время жизни результата поиска в кеше (в
+            секундах). Результаты удаляются из кеша и раньше, при записи в
+            индексы через этот объект. Кеш свой у каждого процесса: запись
+            из другого процесса (например, sync из командной строки при
+            запущенном gui) его не сбрасывает, и устаревшая выдача живёт в
+            нём не дольше result_cache_ttl.
+            llm_concurrency: максимальное количество одновременных запросов
+            к YandexGPT при формировании краткого ответа.
+            llm_cache_path: файл кеша ответов YandexGPT по документам (None -
+            без кеша).
+            llm_cache_size: максимальное количество ответов в кеше.
+            answer_mode: способ формирования краткого ответа: per_document -
+            запрос к YandexGPT по каждому документу и выбор лучшего ответа,
+            packed - один запрос со всеми документами.
+            context_token_budget: максимальный размер документов (в токенах),
+            передаваемых YandexGPT одним запросом в режиме packed.'''
         self.es = Elasticsearch(host)
-        self.analyzer = Prepare_Text()
-        self.maker_embedding = SentenceTransformer("sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2")
+        self.analyzer = Prepare_Text(
+            n_process=n_process,
+            lean=lean,
+            lemma_cache_size=lemma_cache_size,
+            lemma_dictionary_path=lemma_dictionary_path,
+            lemma_dictionary_read_only=lemma_dictionary_read_only
+        )
+        self.maker_embedding = SentenceTransformer(EMBEDDING_MODEL_NAME)
+        self.corpus_cache = Corpus_Cache(corpus_cache_dir) if corpus_cache_dir else None
+        self.embedding_store = None
+        if embedding_store_path:
+            self.embedding_store = Embedding_Store(
+                embedding_store_path,
+                dim=self.maker_embedding.get_sentence_embedding_dimension(),
+                model_name=EMBEDDING_MODEL_NAME
+            )
+        self.query_embeddings = LRU_Cache(query_cache_size, query_cache_path)
+        self.search_results = Result_Cache(result_cache_size, result_cache_ttl)
+        self.llm_concurrency = llm_concurrency
+        self.llm_cache = LLM_Cache(llm_cache_path, llm_cache_size) if llm_cache_path else None
+        self.answer_mode = answer_mode
+        self.context_token_budget = context_token_budget
+
+    def close(self) -> None:
+        '''Сохранение накопленных кешей на диск перед завершением работы.'''
+        self.query_embeddings.save()
+        self.analyzer.save_lemma_dictionary()
+        short_answer.close()
+        if self.llm_cache:
+            self.llm_cache.close()
 
     def create_index(self, index_name: str, index_settings) -> None:
         '''Создание нового индекса в Elasticsearch.
@@ -27,6 +121,7 @@ class My_search:
             index_settings: настройки индекса по Elasticsearch нотации.'''
         if not self.es.indices.exists(index=index_name):
             self.es.indices.create(index=index_name, body=index_settings)
+            self.search_results.invalidate([index_name])
         else:
             print(
                 "Индекс уже есть, если хотите его пересоздать, то сначала удалите его!"
@@ -50,6 +145,7 @@ class My_search:
             index_name: наименование индекса, который нужно удалить.'''
         if self.es.indices.exists(index=index_name):
             self.es.indices.delete(index=index_name)
+            self.search_results.invalidate([index_name])
         else:
             print("Такого индекса не существует!")
 
@@ -63,6 +159,23 @@ class My_search:
         for index_name in indices_names:
             self.delete_index(index_name)
 
+    def build_prefix_index(self, index_name: str, path: str) -> Prefix_Index:
+        '''Построение индекса подсказок по заголовкам и тегам документов и
+        сохранение его на диск (загружается gui при запуске).
+
+        Args:
+            index_name: наименование индекса со стандартным анализатором.
+            path: путь к файлу индекса подсказок.
+
+        Returns:
+            Prefix_Index: индекс подсказок.'''
+        self.es.indices.refresh(index=index_name)
+        prefix_index = Prefix_Index.from_elasticsearch(self.es, index_name)
+        prefix_index.save(path)
+        print(f"Индекс подсказок построен: {len(prefix_index)} строк")
+
+        return prefix_index
+
     def add_doc(self, doc: dict[str, str], indices_names: list[str], processing_fields: list[str]) -> None:
         '''Добавление одного документа в индексы Elasticsearch.
 
@@ -82,55 +195,313 @@ class My_search:
                 custom_analyzer_doc[field] = self.analyzer.light_prepare_text(doc[field])
                 custom_analyzer_doc[f"true_{field}"] = self.analyzer.light_prepare_text(doc[field])
 
-        doc["content_embedding"] = self.maker_embedding.encode(doc["content"]).tolist()
-        custom_analyzer_doc["content_embedding"] = self.maker_embedding.encode(custom_analyzer_doc["content"]).tolist()
+        doc_id = self.__make_doc_id__(
+            {field: self.analyzer.light_prepare_text(doc[field]) for field in doc}
+        )
+
+        doc["doc_id"] = custom_analyzer_doc["doc_id"] = doc_id
+        doc["content_embedding"], custom_analyzer_doc["content_embedding"] = self.__encode_batch__(
+            [doc["content"], custom_analyzer_doc["content"]], batch_size=2
+        )
 
         for index_name in indices_names:
             if re.search("standart", index_name):
-                self.es.index(index=index_name, document=doc)
+                self.es.index(index=index_name, id=doc_id, document=doc)
             else:
-                self.es.index(index=index_name, document=custom_analyzer_doc)
+                self.es.index(index=index_name, id=doc_id, document=custom_analyzer_doc)
+        self.__invalidate_results__(indices_names)
 
-    def add_docs(
-        self, path_excel_docs: str, indices_names: list[str], fields: list[str],
-        processing_fields: list[str], num_of_docs: int
-    ) -> None:
-        '''Добавления массива документов, представленных в excel формате.
+    def __invalidate_results__(self, indices_names: list[str]) -> None:
+        '''Сброс кеша результатов поиска после записи в индексы. Сначала
+        индексы обновляются (refresh), иначе до очередного обновления
+        (refresh_interval) поиск не видит новые документы и в кеш на всё
+        время жизни записи попала бы выдача без них.
 
         Args:
-            path_excel_docs: путь к excel файлу с документами.
-            indices_names: наименования индексов, в которые нужно загрузить
-            документы.
-            fields: поля документов (столбы в excel таблице), которые нужно
-            загружать.
-            processing_fields: поля документов, которые необходимо подготовить
-            перед загрузкой.
-            num_of_docs: количество документов (строк), которые необходимо загрузить.'''
-        docs = self.analyzer.prepare_docs(
-            path=path_excel_docs,
-            columns=fields,
-            processing_columns=processing_fields,
-            num_of_docs=num_of_docs
-        )
-        true_docs = self.analyzer.light_prepare_docs(
-            path=path_excel_docs,
+            indices_names: индексы, в которые были записаны изменения.'''
+        self.es.indices.refresh(index=indices_names)
+        self.search_results.invalidate(indices_names)
+
+    def __make_doc_id__(self, true_doc: dict[str, str]) -> str:
+        '''Формирование детерминированного идентификатора документа по
+        хешу его содержимого. Повторная загрузка того же документа
+        перезаписывает его, а не создаёт дубликат.
+
+        Args:
+            true_doc: словарь (поле, значение) документа после облегчённой
+            подготовки.
+
+        Returns:
+            str: идентификатор документа.'''
+        content = json.dumps(true_doc, ensure_ascii=False, sort_keys=True)
+        return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+    def __load_json__(self, path: str) -> dict | None:
+        '''Чтение служебного json файла (контрольной точки или манифеста).
+
+        Args:
+            path: путь к файлу.
+
+        Returns:
+            dict | None: содержимое файла или None, если файла нет.'''
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding="utf-8") as file:
+            return json.load(file)
+
+    def __save_json__(self, path: str, data: dict) -> None:
+        '''Атомарная запись служебного json файла (файл либо записан
+        полностью, либо остаётся прежним).
+
+        Args:
+            path: путь к файлу.
+            data: данные для записи.'''
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump(data, file, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def __read_true_chunks__(
+        self, path_docs: str, fields: list[str], read_chunk_size: int,
+        num_of_docs: int | None = None
+    ):
+        '''Потоковое чтение документов с облегчённой подготовкой.
+
+        Args:
+            path_docs: путь к файлу с документами.
+            fields: поля документов, которые нужно загружать.
+            read_chunk_size: количество строк файла в одной пачке.
+            num_of_docs: сколько строк загрузить из файла (None - все строки).
+
+        Returns:
+            генератор подготовленных пачек, строки, оказавшиеся пустыми
+            после очистки, удалены.'''
+        for chunk in read_docs_chunks(
+            path=path_docs,
             columns=fields,
+            chunk_size=read_chunk_size,
             num_of_docs=num_of_docs
+        ):
+            true_docs = self.analyzer.light_prepare_chunk(chunk)
+            yield true_docs[(true_docs != "").any(axis=1)].reset_index(drop=True)
+
+    def __update_manifest__(
+        self, true_docs: pd.DataFrame, key_field: str, manifest: dict[str, str]
+    ) -> list[str]:
+        '''Добавление строк пачки в манифест (ключ строки -> идентификатор
+        документа). Ключом строки служит значение поля key_field, если оно
+        пустое или повторяется, то ключом становится идентификатор документа.
+
+        Args:
+            true_docs: пачка документов после облегчённой подготовки.
+            key_field: поле, однозначно определяющее строку (например, url).
+            manifest: манифест, который нужно дополнить.
+
+        Returns:
+            list[str]: ключи строк пачки (в порядке строк).'''
+        keys = []
+        for row in range(true_docs.shape[0]):
+            doc_id = self.__make_doc_id__(
+                {column: true_docs.loc[row, column] for column in true_docs.columns}
+            )
+            key = true_docs.loc[row, key_field] if key_field in true_docs.columns else ""
+            if not key or key in manifest:
+                key = doc_id
+            manifest[key] = doc_id
+            keys.append(key)
+
+        return keys
+
+    def __encode_batch__(self, texts: list[str], batch_size: int) -> list[list[float]]:
+        '''Вычисление эмбеддингов для списка строк большими пачками.
+        Одинаковые строки (с совпадающим хешем) кодируются только один раз,
+        эмбеддинги строк из хранилища эмбеддингов не вычисляются повторно.
+
+        Args:
+            texts: строки, для которых нужно вычислить эмбеддинги.
+            batch_size: размер пачки, передаваемой в SentenceTransformer.
+
+        Returns:
+            list[list[float]]: эмбеддинги в том же порядке, что и строки.'''
+        texts = [text if type(text) == str else "" for text in texts]
+        hashes = [hashlib.sha1(text.encode("utf-8")).hexdigest() for text in texts]
+
+        unique_texts = {}
+        for text_hash, text in zip(hashes, texts):
+            if text_hash not in unique_texts:
+                unique_texts[text_hash] = text
+
+        embeddings = {}
+        if self.embedding_store is not None:
+            stored = self.embedding_store.get(list(unique_texts))
+            for text_hash, vector in zip(list(unique_texts), stored):
+                if vector is not None:
+                    embeddings[text_hash] = vector.tolist()
+                    del unique_texts[text_hash]
+
+        if unique_texts:
+            vectors = self.maker_embedding.encode(
+                list(unique_texts.values()), batch_size=batch_size
+            )
+            for text_hash, vector in zip(unique_texts, vectors):
+                embeddings[text_hash] = vector.tolist()
+            if self.embedding_store is not None:
+                self.embedding_store.append(list(unique_texts), vectors)
+
+        return [embeddings[text_hash] for text_hash in hashes]
+
+    def __bulk_index__(self, actions, chunk_size: int, thread_count: int) -> list[dict]:
+        '''Загрузка документов в Elasticsearch через bulk API. Действия
+        отправляются пачками по chunk_size штук, несколько пачек отправляются
+        параллельно. Ошибка в отдельном документе не прерывает загрузку.
+
+        Args:
+            actions: итерируемый набор действий bulk API (словари с ключами
+            "_index", "_id" и "_source" или "_op_type").
+            chunk_size: количество документов в одном bulk запросе.
+            thread_count: количество параллельно выполняемых bulk запросов.
+
+        Returns:
+            list[dict]: список ошибок по отдельным документам (пустой, если
+            все документы загружены успешно).'''
+        failures = []
+        for ok, info in helpers.parallel_bulk(
+            self.es,
+            actions,
+            thread_count=thread_count,
+            chunk_size=chunk_size,
+            raise_on_error=False,
+            raise_on_exception=False
+        ):
+            # Удаление уже отсутствующего документа ошибкой не считается
+            if not ok and info.get("delete", {}).get("status") != 404:
+                failures.append(info)
+
+        return failures
+
+    def __embed_chunk__(
+        self, docs: pd.DataFrame, true_docs: pd.DataFrame, embedding_batch_size: int
+    ) -> tuple[list[list[float]], list[list[float]]]:
+        '''Вычисление эмбеддингов содержимого пачки документов.
+
+        Args:
+            docs: полностью подготовленная пачка документов.
+            true_docs: та же пачка после облегчённой подготовки.
+            embedding_batch_size: размер пачки при вычислении эмбеддингов.
+
+        Returns:
+            (true_embeddings, embeddings): эмбеддинги поля content из
+            true_docs и из docs.'''
+        # Эмбеддинги исходного и лемматизированного текста считаются одним
+        # проходом по обоим столбцам
+        num_of_rows = docs.shape[0]
+        embeddings = self.__encode_batch__(
+            list(true_docs["content"]) + list(docs["content"]),
+            batch_size=embedding_batch_size
         )
-        true_docs = true_docs.fillna("")
-        true_docs = true_docs.astype(str)
 
-        # Заменяем оставшиеся NaN значения пустой строкой
-        true_docs = true_docs.fillna("")
-        true_docs = true_docs.astype(str)
-        true_docs = true_docs.replace(['nan', 'NaN', 'null', 'None'], '',
-                                      regex=True)  # Добавляем замену строковых представлений
+        return embeddings[:num_of_rows], embeddings[num_of_rows:]
 
-        docs = docs.fillna("")
-        docs = docs.astype(str)
-        docs = docs.replace(['nan', 'NaN', 'null', 'None'], '', regex=True)  # Обрабатываем также основной DataFrame
+    def __prepared_chunks__(
+        self, path_docs: str, fields: list[str], processing_fields: list[str],
+        read_chunk_size: int, num_of_docs: int | None, embedding_batch_size: int,
+        last_chunk: int = -1
+    ):
+        '''Потоковая подготовка документов файла: облегчённая и полноценная
+        подготовка и эмбеддинги. Если задан кеш корпуса, подготовленные
+        пачки берутся из него, а новые пачки сохраняются в него.
 
-        for row in range(docs.shape[0]):
+        Args:
+            path_docs: путь к файлу с документами.
+            fields: поля документов, которые нужно загружать.
+            processing_fields: поля документов, которые необходимо подготовить.
+            read_chunk_size: количество строк файла в одной пачке.
+            num_of_docs: сколько строк загрузить из файла (None - все строки).
+            embedding_batch_size: размер пачки при вычислении эмбеддингов.
+            last_chunk: номер последней уже загруженной пачки, для неё и
+            предыдущих пачек выполняется только облегчённая подготовка.
+
+        Returns:
+            генератор кортежей (номер пачки, true_docs, подготовка), где
+            подготовка - (docs, true_embeddings, embeddings) или None для
+            уже загруженных пачек.'''
+        cache_key = None
+        if self.corpus_cache is not None:
+            cache_key = self.corpus_cache.make_key(
+                source_hash=file_hash(path_docs),
+                analyzer_version=self.analyzer.version(),
+                embedding_model=EMBEDDING_MODEL_NAME,
+                fields=list(fields),
+                processing_fields=list(processing_fields),
+                read_chunk_size=read_chunk_size,
+                num_of_docs=num_of_docs
+            )
+
+            num_of_cached = self.corpus_cache.num_of_chunks(cache_key)
+            if num_of_cached is not None:
+                print("Подготовленный корпус найден в кеше")
+                for num_of_chunk in range(num_of_cached):
+                    docs, true_docs, true_embeddings, embeddings = self.corpus_cache.load_chunk(
+                        cache_key, num_of_chunk
+                    )
+                    if num_of_chunk <= last_chunk:
+                        yield num_of_chunk, true_docs, None
+                    else:
+                        yield num_of_chunk, true_docs, (docs, true_embeddings, embeddings)
+                return
+
+        num_of_chunks = 0
+        for num_of_chunk, true_docs in enumerate(self.__read_true_chunks__(
+            path_docs, fields, read_chunk_size, num_of_docs
+        )):
+            num_of_chunks = num_of_chunk + 1
+            if num_of_chunk <= last_chunk:
+                yield num_of_chunk, true_docs, None
+                continue
+
+            cached = None
+            if cache_key is not None:
+                cached = self.corpus_cache.load_chunk(cache_key, num_of_chunk)
+
+            if cached is not None:
+                docs, _, true_embeddings, embeddings = cached
+            else:
+                docs = self.analyzer.prepare_chunk(true_docs, processing_fields)
+                true_embeddings, embeddings = self.__embed_chunk__(docs, true_docs, embedding_batch_size)
+                if cache_key is not None:
+                    self.corpus_cache.save_chunk(
+                        cache_key, num_of_chunk, docs, true_docs, true_embeddings, embeddings
+                    )
+
+            yield num_of_chunk, true_docs, (docs, true_embeddings, embeddings)
+
+        if cache_key is not None:
+            self.corpus_cache.mark_complete(cache_key, num_of_chunks)
+
+    def __make_actions__(
+        self, docs: pd.DataFrame, true_docs: pd.DataFrame,
+        true_embeddings: list[list[float]], embeddings: list[list[float]],
+        indices_names: list[str]
+    ) -> list[dict]:
+        '''Формирование действий bulk API для пачки документов.
+
+        Args:
+            docs: полностью подготовленная пачка документов.
+            true_docs: та же пачка после облегчённой подготовки (строки
+            должны совпадать со строками docs).
+            true_embeddings: эмбеддинги поля content из true_docs.
+            embeddings: эмбеддинги поля content из docs.
+            indices_names: наименования индексов, в которые нужно загрузить
+            документы.
+
+        Returns:
+            list[dict]: действия bulk API (по одному на документ и индекс),
+            идентификатор документа одинаков во всех индексах и хранится
+            в поле doc_id.'''
+        num_of_rows = docs.shape[0]
+
+        actions = []
+        for row in range(num_of_rows):
             custom_analyzer_doc = {}
             doc = {}
             for column in docs.columns:
@@ -138,15 +509,221 @@ class My_search:
                 custom_analyzer_doc[f"true_{column}"] = true_docs.loc[row, column]
                 doc[column] = true_docs.loc[row, column]
 
+            doc_id = self.__make_doc_id__(doc)
 
-            doc["content_embedding"] = self.maker_embedding.encode(doc["content"] if type(doc["content"]) == str else "").tolist()
-            custom_analyzer_doc["content_embedding"] = self.maker_embedding.encode(custom_analyzer_doc["content"] if type(custom_analyzer_doc["content"]) == str else "").tolist()
+            doc["doc_id"] = custom_analyzer_doc["doc_id"] = doc_id
+            doc["content_embedding"] = true_embeddings[row]
+            custom_analyzer_doc["content_embedding"] = embeddings[row]
 
             for index_name in indices_names:
                 if re.search("standart", index_name):
-                    self.es.index(index=index_name, document=doc)
+                    actions.append({"_index": index_name, "_id": doc_id, "_source": doc})
                 else:
-                    self.es.index(index=index_name, document=custom_analyzer_doc)
+                    actions.append({"_index": index_name, "_id": doc_id, "_source": custom_analyzer_doc})
+
+        return actions
+
+    def add_docs(
+        self, path_docs: str, indices_names: list[str], fields: list[str],
+        processing_fields: list[str], num_of_docs: int | None = None,
+        bulk: bool = True, chunk_size: int = 500, thread_count: int = 4,
+        embedding_batch_size: int = 64, read_chunk_size: int = 1000,
+        resume: bool = False, checkpoint_path: str | None = None,
+        key_field: str = "url", manifest_path: str | None = None
+    ) -> list[dict]:
+        '''Добавление массива документов из файла (xlsx, csv, jsonl или
+        parquet). Файл читается, подготавливается и загружается пачками по
+        read_chunk_size строк, поэтому потребление памяти не зависит от
+        размера корпуса.
+
+        После каждой успешно загруженной пачки сохраняется контрольная точка.
+        Если загрузка прервалась, повторный вызов с resume=True пропускает
+        уже загруженные пачки. Идентификаторы документов вычисляются по
+        содержимому, поэтому повторная загрузка пачки не создаёт дубликатов.
+        После успешной загрузки сохраняется манифест для sync_docs.
+
+        Args:
+            path_docs: путь к файлу с документами.
+            indices_names: наименования индексов, в которые нужно загрузить
+            документы.
+            fields: поля документов (столбцы в таблице), которые нужно
+            загружать.
+            processing_fields: поля документов, которые необходимо подготовить
+            перед загрузкой.
+            num_of_docs: количество документов (строк), которые необходимо
+            загрузить (None - все документы).
+            bulk: загружать документы через bulk API (True) или по одному
+            запросу на документ (False).
+            chunk_size: количество документов в одном bulk запросе.
+            thread_count: количество параллельно выполняемых bulk запросов.
+            embedding_batch_size: размер пачки при вычислении эмбеддингов.
+            read_chunk_size: количество строк файла, обрабатываемых за один раз.
+            resume: продолжить прерванную загрузку с последней контрольной точки.
+            checkpoint_path: путь к файлу контрольной точки (по умолчанию
+            рядом с файлом документов).
+            key_field: поле, однозначно определяющее строку файла.
+            manifest_path: путь к файлу манифеста (по умолчанию рядом с
+            файлом документов).
+
+        Returns:
+            list[dict]: список ошибок по отдельным документам (пустой, если
+            все документы загружены успешно).'''
+        if checkpoint_path is None:
+            checkpoint_path = f"{path_docs}.checkpoint.json"
+        if manifest_path is None:
+            manifest_path = f"{path_docs}.manifest.json"
+
+        checkpoint = {
+            "source_hash": file_hash(path_docs),
+            "indices_names": list(indices_names),
+            "fields": list(fields),
+            "processing_fields": list(processing_fields),
+            "read_chunk_size": read_chunk_size,
+            "last_chunk": -1
+        }
+        if resume:
+            saved_checkpoint = self.__load_json__(checkpoint_path)
+            if saved_checkpoint and all(
+                saved_checkpoint.get(key) == value
+                for key, value in checkpoint.items() if key != "last_chunk"
+            ):
+                checkpoint["last_chunk"] = saved_checkpoint["last_chunk"]
+                print(f"Продолжаем загрузку с пачки {checkpoint['last_chunk'] + 1}")
+            else:
+                print("Подходящая контрольная точка не найдена, загрузка начнётся сначала")
+        self.__save_json__(checkpoint_path, checkpoint)
+
+        failures = []
+        manifest = {}
+
+        for num_of_chunk, true_docs, prepared in self.__prepared_chunks__(
+            path_docs, fields, processing_fields, read_chunk_size, num_of_docs,
+            embedding_batch_size, last_chunk=checkpoint["last_chunk"]
+        ):
+            self.__update_manifest__(true_docs, key_field, manifest)
+            if prepared is None:
+                continue
+
+            docs, true_embeddings, embeddings = prepared
+            actions = self.__make_actions__(docs, true_docs, true_embeddings, embeddings, indices_names)
+
+            if bulk:
+                chunk_failures = self.__bulk_index__(actions, chunk_size, thread_count)
+            else:
+                chunk_failures = []
+                for action in actions:
+                    self.es.index(index=action["_index"], id=action["_id"], document=action["_source"])
+            self.__invalidate_results__(indices_names)
+
+            # Контрольная точка двигается только пока все пачки загружены без
+            # ошибок, иначе при продолжении пачка с ошибками будет пропущена
+            if not chunk_failures and not failures:
+                checkpoint["last_chunk"] = num_of_chunk
+                self.__save_json__(checkpoint_path, checkpoint)
+            failures += chunk_failures
+
+        self.analyzer.save_lemma_dictionary()
+
+        if failures:
+            print(f"Не удалось загрузить документов: {len(failures)}")
+            for failure in failures[:10]:
+                print(failure)
+        else:
+            self.__save_json__(manifest_path, manifest)
+
+        return failures
+
+    def sync_docs(
+        self, path_docs: str, indices_names: list[str], fields: list[str],
+        processing_fields: list[str], key_field: str = "url",
+        manifest_path: str | None = None, chunk_size: int = 500,
+        thread_count: int = 4, embedding_batch_size: int = 64,
+        read_chunk_size: int = 1000, num_of_docs: int | None = None
+    ) -> list[dict]:
+        '''Инкрементальная синхронизация индексов с файлом документов.
+        Файл сравнивается с манифестом (ключ строки -> хеш содержимого),
+        сохранённым при прошлой загрузке: подготавливаются и загружаются
+        только новые и изменённые строки, документы исчезнувших строк
+        удаляются. Время работы пропорционально объёму изменений.
+
+        Args:
+            path_docs: путь к файлу с документами.
+            indices_names: наименования индексов, которые нужно обновить.
+            fields: поля документов (столбцы в таблице), которые нужно
+            загружать.
+            processing_fields: поля документов, которые необходимо подготовить
+            перед загрузкой.
+            key_field: поле, однозначно определяющее строку файла.
+            manifest_path: путь к файлу манифеста (по умолчанию рядом с
+            файлом документов).
+            chunk_size: количество документов в одном bulk запросе.
+            thread_count: количество параллельно выполняемых bulk запросов.
+            embedding_batch_size: размер пачки при вычислении эмбеддингов.
+            read_chunk_size: количество строк файла, обрабатываемых за один раз.
+            num_of_docs: количество строк файла, которые нужно синхронизировать
+            (None - все строки). Должно совпадать со значением, переданным в
+            add_docs, иначе строки за пределами загруженных будут считаться
+            новыми или удалёнными.
+
+        Returns:
+            list[dict]: список ошибок по отдельным документам (пустой, если
+            синхронизация прошла успешно).'''
+        if manifest_path is None:
+            manifest_path = f"{path_docs}.manifest.json"
+
+        old_manifest = self.__load_json__(manifest_path) or {}
+        manifest = {}
+        failures = []
+        num_of_changed = 0
+
+        for true_docs in self.__read_true_chunks__(path_docs, fields, read_chunk_size, num_of_docs):
+            keys = self.__update_manifest__(true_docs, key_field, manifest)
+            changed_rows = [
+                row for row, key in enumerate(keys)
+                if old_manifest.get(key) != manifest[key]
+            ]
+            if not changed_rows:
+                continue
+
+            true_docs = true_docs.loc[changed_rows].reset_index(drop=True)
+            docs = self.analyzer.prepare_chunk(true_docs, processing_fields)
+            true_embeddings, embeddings = self.__embed_chunk__(docs, true_docs, embedding_batch_size)
+
+            actions = self.__make_actions__(docs, true_docs, true_embeddings, embeddings, indices_names)
+            failures += self.__bulk_index__(actions, chunk_size, thread_count)
+            self.__invalidate_results__(indices_names)
+            num_of_changed += len(changed_rows)
+
+        self.analyzer.save_lemma_dictionary()
+
+        # Старые версии изменённых строк и исчезнувшие строки удаляем, если
+        # их содержимое не встречается в файле под другим ключом
+        actual_ids = set(manifest.values())
+        outdated_ids = {
+            doc_id for key, doc_id in old_manifest.items()
+            if manifest.get(key) != doc_id and doc_id not in actual_ids
+        }
+        failures += self.__bulk_index__(
+            (
+                {"_op_type": "delete", "_index": index_name, "_id": doc_id}
+                for doc_id in outdated_ids for index_name in indices_names
+            ),
+            chunk_size,
+            thread_count
+        )
+        if outdated_ids:
+            self.__invalidate_results__(indices_names)
+
+        print(f"Добавлено или обновлено документов: {num_of_changed}, удалено: {len(outdated_ids)}")
+        if failures:
+            print(f"Не удалось синхронизировать документов: {len(failures)}")
+            for failure in failures[:10]:
+                print(failure)
+        else:
+            self.__save_json__(manifest_path, manifest)
+
+        return failures
+
 ## Устаревшая функция
     # def search_many_fields_many_indices(
     #     self,
@@ -198,39 +775,197 @@ class My_search:
     #         except:
     #             print(f"title: {doc["content"]}")
 
+    def __pack_contexts__(self, context_texts: list[str], token_budget: int) -> str:
+        '''Объединение текстов поисковой выдачи в один документ размером не
+        больше token_budget токенов. Токены оцениваются по словам с запасом
+        (TOKENS_PER_WORD токена на слово). Каждый текст получает небольшую
+        гарантированную долю бюджета (CONTEXT_FLOOR_SHARE от равной доли),
+        остаток распределяется по убыванию релевантности: более релевантные
+        тексты берутся целиком, обрезаются менее релевантные.
+
+        Args:
+            context_texts: тексты по убыванию релевантности.
+            token_budget: максимальное количество токенов.
+
+        Returns:
+            str: объединённый документ.'''
+        words = [text.split() for text in context_texts]
+        if not words:
+            return ""
+
+        word_budget = token_budget // TOKENS_PER_WORD
+        floor = int(word_budget / len(words) * CONTEXT_FLOOR_SHARE)
+        sizes = [min(len(text_words), floor) for text_words in words]
+        rest = word_budget - sum(sizes)
+        for i, text_words in enumerate(words):
+            extra = min(len(text_words) - sizes[i], rest)
+            sizes[i] += extra
+            rest -= extra
+
+        return "\n\n".join(
+            f"Документ {i + 1}:\n" + " ".join(text_words[:size])
+            for i, (text_words, size) in enumerate(zip(words, sizes)) if size
+        )
+
+    def __final_answer__(
+        self, prompt: str, document: str, query: str, on_chunk=None, is_cancelled=None
+    ) -> str:
+        '''Запрос итогового ответа к YandexGPT целиком или по частям.
+
+        Args:
+            prompt: системный промпт.
+            document: документ.
+            query: вопрос.
+            on_chunk: функция, в которую передаются части ответа (None -
+            ответ запрашивается целиком).
+            is_cancelled: функция, возвращающая True, если ответ больше не
+            нужен.
+
+        Returns:
+            str: ответ.'''
+        if on_chunk is None:
+            return short_answer.run(get_short_answer(prompt, document, query))
+
+        answer = ""
+        for answer in short_answer.iterate(get_short_answer_stream(prompt, document, query)):
+            if is_cancelled and is_cancelled():
+                break
+            on_chunk(answer)
+
+        return answer
+
     def __get_answer__(
         self,
         query: str,
-        context_texts: list[str]
+        context_texts: list[str],
+        on_chunk=None,
+        is_cancelled=None,
+        mode: str | None = None,
+        use_cache: bool = True
     ) -> str:
         '''Формирование краткого ответа по запросу на основе поисковой выдачи.
 
         Args:
             query: запрос, на который нужно сформировать ответ.
             context_texts: поисковая выдача.
+            on_chunk: функция, в которую по мере генерации передаётся
+            сформированная часть итогового ответа (None - итоговый ответ
+            запрашивается целиком). Вызывается в вызывающем потоке.
+            is_cancelled: функция, возвращающая True, если ответ больше не
+            нужен (например, пользователь ввёл новый запрос). Проверяется
+            перед запросами к YandexGPT и при получении каждой части ответа.
+            mode: способ формирования ответа (None - self.answer_mode):
+            per_document - ответ по каждому документу и выбор лучшего из них
+            (len(context_texts) + 1 запрос), packed - все документы в пределах
+            self.context_token_budget токенов в одном запросе.
+            use_cache: использовать кеш ответов YandexGPT.
 
         Returns:
             str: строка, в которой содержится ответ на вопрос пользователя,
             сформированный при помощи YandexGpt.'''
         prompt_get_answer = "Ты внимательно анализируешь предоставленные документы и точно отвечаешь на вопросы по ним. Если нужной информации нет, то в качестве ответа напиши только число 0 и ничего больше."
         prompt_compare_answers = "На каждой строке тебе дан один вариант ответа, ты внимательно анализируешь их на соответствие вопросу и возвращаешь лучший из них, только его."
+        prompt_packed_answer = "Ты внимательно анализируешь предоставленные документы и точно отвечаешь на вопрос по ним. Документы упорядочены по убыванию соответствия вопросу. Если нужной информации нет, то в качестве ответа напиши только число 0 и ничего больше."
 
-        answers = []
-        for text in context_texts:
-            try:
-                answer = asyncio.run(get_short_answer(prompt_get_answer, text, query))
-                if answer != "0":
+        if mode is None:
+            mode = self.answer_mode
+        if mode not in ANSWER_MODES:
+            raise ValueError(f"Неизвестный способ формирования ответа: {mode}. Доступны: {', '.join(ANSWER_MODES)}")
+        llm_cache = self.llm_cache if use_cache else None
+
+        if is_cancelled and is_cancelled():
+            return "0"
+
+        if mode == "packed":
+            packed = self.__pack_contexts__(context_texts, self.context_token_budget)
+            if not packed:
+                return "0"
+
+            key = llm_cache.make_key(prompt_packed_answer, packed, query) if llm_cache else None
+            answer = llm_cache.get(key) if llm_cache else None
+            if answer is not None:
+                if on_chunk:
+                    on_chunk(answer)
+                return answer
+
+            answer = self.__final_answer__(prompt_packed_answer, packed, query, on_chunk, is_cancelled)
+            if llm_cache and not (is_cancelled and is_cancelled()):
+                llm_cache.put(key, answer)
+            return answer
+
+        # Ответы по документам, которых нет в кеше, запрашиваются
+        # параллельно, после них выбирается лучший ответ
+        async def get_answers() -> list[str]:
+            keys = [None] * len(context_texts)
+            document_answers = [None] * len(context_texts)
+            if llm_cache:
+                for i, text in enumerate(context_texts):
+                    keys[i] = llm_cache.make_key(prompt_get_answer, text, query)
+                    document_answers[i] = llm_cache.get(keys[i])
+
+            missed = [i for i, answer in enumerate(document_answers) if answer is None]
+            new_answers = await get_short_answers(
+                prompt_get_answer, [context_texts[i] for i in missed], query, self.llm_concurrency,
+                is_cancelled=is_cancelled
+            )
+            for i, answer in zip(missed, new_answers):
+                document_answers[i] = answer
+                if llm_cache and isinstance(answer, str):
+                    llm_cache.put(keys[i], answer)
+
+            answers = []
+            for answer in document_answers:
+                if isinstance(answer, str) and answer != "0":
                     answers.append(answer)
-            except:
-                continue
 
-        if answers:
-            answers_for_query = ""
-            for answer in answers:
-                answers_for_query += answer + "\n"
-            return asyncio.run(get_short_answer(prompt_compare_answers, answers_for_query, query))
+            return answers
+
+        answers = short_answer.run(get_answers())
+        if not answers or (is_cancelled and is_cancelled()):
+            return "0"
 
-        return "0"
+        return self.__final_answer__(
+            prompt_compare_answers, "\n".join(answers) + "\n", query, on_chunk, is_cancelled
+        )
+
+    def compare_answer_modes(
+            self,
+            query: str,
+            fields: list[str],
+            indices_names: list[str],
+            fuzziness: float = "AUTO",
+            num_of_responses: int = 10
+    ) -> dict:
+        '''Сравнение способов формирования краткого ответа (per_document и
+        packed) на одной поисковой выдаче: время ответа и совпадение ответов
+        (коэффициент Жаккара по множествам слов). Кеш ответов YandexGPT не
+        используется.
+
+        Args:
+            query: запрос, по которому нужно найти информацию.
+            fields: наименования полей, по которым нужно производить поиск.
+            indices_names: наименования индексов, в которых необходимо производить поиск.
+            fuzziness: количество ошибок, которое можно сделать при сопоставлении слов.
+            num_of_responses: количество документов в выдаче.
+
+        Returns:
+            dict: ответ и время (в секундах) для каждого способа и
+            совпадение ответов (от 0 до 1).'''
+        documents, contexts, prepared_query = self.retrieve(
+            query, fields, indices_names, fuzziness, num_of_responses
+        )
+
+        comparison = {}
+        for mode in ANSWER_MODES:
+            start = time.perf_counter()
+            answer = self.__get_answer__(prepared_query, contexts, mode=mode, use_cache=False)
+            comparison[mode] = {"answer": answer, "seconds": time.perf_counter() - start}
+
+        words = [set(re.findall(r"\w+", comparison[mode]["answer"].lower())) for mode in ANSWER_MODES]
+        union = words[0] | words[1]
+        comparison["agreement"] = len(words[0] & words[1]) / len(union) if union else 1.0
+
+        return comparison
 
 ## Устаревшая функция
     # def search_many_fields_with_qa(
@@ -299,29 +1034,77 @@ class My_search:
     #         except:
     #             print(f"title: {doc["content"]}")
 
-    def search_for_gui(
+    def __encode_query__(self, query: str) -> list[float]:
+        '''Эмбеддинг подготовленного запроса с кешированием: повторные и
+        совпадающие после подготовки запросы не кодируются заново.
+
+        Args:
+            query: запрос после prepare_text.
+
+        Returns:
+            list[float]: эмбеддинг запроса.'''
+        query_embedding = self.query_embeddings.get(query)
+        if query_embedding is None:
+            query_embedding = self.maker_embedding.encode(query).tolist()
+            self.query_embeddings.put(query, query_embedding)
+
+        return query_embedding
+
+    def __multi_search__(self, indices_names: list[str], bodies: list[dict]) -> list[dict]:
+        '''Выполнение нескольких поисковых запросов за одно обращение к
+        Elasticsearch (_msearch). Запросы выполняются параллельно, поэтому
+        время ответа определяется самым долгим из них.
+
+        Args:
+            indices_names: наименования индексов, в которых необходимо производить поиск.
+            bodies: тела поисковых запросов.
+
+        Returns:
+            list[dict]: ответы на запросы в том же порядке.'''
+        searches = []
+        for body in bodies:
+            searches += [{"index": indices_names}, body]
+
+        responses = self.es.msearch(searches=searches)["responses"]
+        for response in responses:
+            if "error" in response:
+                raise RuntimeError(f"Ошибка поискового запроса: {response['error']}")
+
+        return responses
+
+    def __retrieve__(
             self,
             query: str,
             fields: list[str],
             indices_names: list[str],
-            fuzziness: float = "AUTO",
-            num_of_responses: int = 10
-    ) -> (str, list[(str, str)]):
-        '''Функция формирования ответа для вывода его в gui.
+            fuzziness: float,
+            num_of_responses: int,
+            multi_search: bool = True,
+            source_fields: list[str] = DOCUMENT_FIELDS
+    ) -> list[(dict, float)]:
+        '''Гибридный поиск: BM25 и kNN запросы, объединённые через RRF.
 
         Args:
-            query: запрос, по которому нужно найти информацию.
+            query: запрос после prepare_text.
             fields: наименования полей, по которым нужно производить поиск.
             indices_names: наименования индексов, в которых необходимо производить поиск.
             fuzziness: количество ошибок, которое можно сделать при сопоставлении слов.
-            num_of_responses: количество ответов, которые нужно вывести в качестве ответа
-            на запрос.
+            num_of_responses: количество документов в выдаче.
+            multi_search: отправить оба запроса одним _msearch запросом (True)
+            или выполнить их последовательно (False).
+            source_fields: поля документов, которые нужно вернуть (эмбеддинги
+            и остальные поля в ответ не попадают).
 
         Returns:
-            (str, list[(str, str)]): возвращает кортеж (краткий ответ, сформированный gpt;
-            поисковая выдача).'''
-        query = self.analyzer.prepare_text(query)
-        query_embedding = self.maker_embedding.encode(query).tolist()
+            list[(dict, float)]: найденные документы Elasticsearch и их
+            RRF-оценки по убыванию оценки.'''
+        query_embedding = self.__encode_query__(query)
+
+        # Каждая статья хранится во всех индексах и может занять до
+        # len(indices_names) мест в выдаче, поэтому кандидатов запрашивается
+        # столько, чтобы после объединения по doc_id осталось не меньше
+        # num_of_responses * 2 разных статей
+        num_of_candidates = num_of_responses * 2 * len(indices_names)
 
         # 1. BM25 запрос
         bm25_query = {
@@ -333,7 +1116,8 @@ class My_search:
                     "type": "best_fields"
                 }
             },
-            "size": num_of_responses * 2
+            "_source": {"includes": source_fields},
+            "size": num_of_candidates
         }
 
         # 2. kNN запрос
@@ -341,33 +1125,33 @@ class My_search:
             "knn": {
                 "field": "content_embedding",
                 "query_vector": query_embedding,
-                "k": num_of_responses * 2,
-                "num_candidates": 100
+                "k": num_of_candidates,
+                "num_candidates": max(100, num_of_candidates)
             },
-            "size": num_of_responses * 2
+            "_source": {"includes": source_fields},
+            "size": num_of_candidates
         }
 
         # 3. Выполняем оба запроса
-        bm25_results = self.es.search(index=indices_names, body=bm25_query)
-        knn_results = self.es.search(index=indices_names, body=knn_query)
+        if multi_search:
+            bm25_results, knn_results = self.__multi_search__(indices_names, [bm25_query, knn_query])
+        else:
+            bm25_results = self.es.search(index=indices_names, body=bm25_query)
+            knn_results = self.es.search(index=indices_names, body=knn_query)
 
-        # 4. Применяем RRF вручную и собираем полные документы
+        # 4. Применяем RRF вручную и собираем полные документы. Один документ
+        # хранится во всех индексах, поэтому оценки всех его вхождений
+        # складываются в одну по каноническому идентификатору doc_id
         def manual_rrf(bm25_hits, knn_hits, rank_constant=20):
             scores = {}
             docs = {}  # Будем хранить документы здесь
 
-            # Обрабатываем BM25 результаты
-            for rank, hit in enumerate(bm25_hits, 1):
-                doc_id = hit["_id"]
-                scores[doc_id] = scores.get(doc_id, 0) + 1 / (rank + rank_constant)
-                docs[doc_id] = hit  # Сохраняем документ
-
-            # Обрабатываем kNN результаты
-            for rank, hit in enumerate(knn_hits, 1):
-                doc_id = hit["_id"]
-                scores[doc_id] = scores.get(doc_id, 0) + 1 / (rank + rank_constant)
-                if doc_id not in docs:  # Сохраняем документ, если его еще нет
-                    docs[doc_id] = hit
+            for hits in (bm25_hits, knn_hits):
+                for rank, hit in enumerate(hits, 1):
+                    doc_id = hit["_source"].get("doc_id", hit["_id"])
+                    scores[doc_id] = scores.get(doc_id, 0) + 1 / (rank + rank_constant)
+                    if doc_id not in docs:  # Сохраняем документ, если его еще нет
+                        docs[doc_id] = hit
 
             # Сортируем по убыванию RRF-оценки
             sorted_ids = sorted(scores.items(), key=lambda x: x[1], reverse=True)
@@ -375,23 +1159,93 @@ class My_search:
             # Возвращаем документы в нужном порядке
             return [(docs[doc_id], score) for doc_id, score in sorted_ids]
 
-        final_results = manual_rrf(
+        return manual_rrf(
             bm25_results["hits"]["hits"],
             knn_results["hits"]["hits"]
         )[:num_of_responses]
 
-        contexts = []
+    def __fetch_contexts__(self, final_results: list[(dict, float)]) -> list[str]:
+        '''Загрузка текстов документов поисковой выдачи одним _mget запросом.
+        Поисковые запросы тексты не возвращают, поэтому тексты загружаются
+        только для документов, попавших в выдачу, и только в исходном виде:
+        поле content индексов со стандартным анализатором или true_content
+        остальных индексов (лемматизированный content не загружается).
+
+        Args:
+            final_results: результат __retrieve__.
+
+        Returns:
+            list[str]: тексты документов в порядке выдачи.'''
+        if not final_results:
+            return []
+
+        docs = []
         for hit, score in final_results:
-            context = ""
-            try:
-                context = hit["_source"]["true_content"]
-            except:
-                context = hit["_source"]["content"]
-            contexts.append(context)
+            field = "content" if re.search("standart", hit["_index"]) else "true_content"
+            docs.append({"_index": hit["_index"], "_id": hit["_id"], "_source": [field]})
 
-        quick_answer = self.__get_answer__(query=query, context_texts=contexts)
-        documents = []
+        contexts = []
+        for doc, response in zip(docs, self.es.mget(docs=docs)["docs"]):
+            contexts.append(response.get("_source", {}).get(doc["_source"][0], ""))
+
+        return contexts
+
+    def retrieve(
+            self,
+            query: str,
+            fields: list[str],
+            indices_names: list[str],
+            fuzziness: float = "AUTO",
+            num_of_responses: int = 10,
+            multi_search: bool = True,
+            with_contexts: bool = True
+    ) -> (list[(str, str)], list[str], str):
+        '''Первый этап поиска: поисковая выдача без краткого ответа. Занимает
+        время поиска в Elasticsearch, поэтому выдачу можно показать, не
+        дожидаясь ответа YandexGPT (answer).
+
+        Args:
+            query: запрос, по которому нужно найти информацию.
+            fields: наименования полей, по которым нужно производить поиск.
+            indices_names: наименования индексов, в которых необходимо производить поиск.
+            fuzziness: количество ошибок, которое можно сделать при сопоставлении слов.
+            num_of_responses: количество ответов, которые нужно вывести в качестве ответа
+            на запрос.
+            multi_search: отправить BM25 и kNN запросы одним _msearch запросом
+            (True) или выполнить их последовательно (False).
+            with_contexts: загрузить тексты найденных документов для answer
+            (False - только поисковая выдача, например при поиске во время
+            ввода).
+
+        Returns:
+            (list[(str, str)], list[str], str): возвращает кортеж (поисковая выдача;
+            тексты найденных документов для формирования краткого ответа или
+            пустой список, если with_contexts=False; запрос после prepare_text,
+            который передаётся в answer).'''
+        query = self.analyzer.prepare_text(query)
+
+        # Тексты документов хранятся в кеше вместе с выдачей: если выдача
+        # уже была получена без текстов (with_contexts=False), они
+        # загружаются один раз и дописываются в ту же запись
+        key = (query, tuple(fields), tuple(indices_names), fuzziness, num_of_responses)
+        cached = self.search_results.get(key)
+        if cached is None:
+            generation = self.search_results.generation(indices_names)
+            final_results = self.__retrieve__(
+                query, fields, indices_names, fuzziness, num_of_responses, multi_search
+            )
+            cached = {
+                "results": final_results,
+                "contexts": self.__fetch_contexts__(final_results) if with_contexts else None
+            }
+            self.search_results.put(key, indices_names, cached, generation)
+        elif with_contexts and cached["contexts"] is None:
+            cached["contexts"] = self.__fetch_contexts__(cached["results"])
+
+        final_results = cached["results"]
+        contexts = cached["contexts"] if with_contexts else []
 
+        documents = []
         for hit, score in final_results:
             doc = hit["_source"]
             try:
@@ -399,6 +1253,78 @@ class My_search:
             except:
                 documents.append((doc["url"], doc["summary"]))
 
+        return documents, contexts, query
+
+    def answer(
+            self,
+            query: str,
+            contexts: list[str],
+            on_chunk=None,
+            is_cancelled=None,
+            mode: str | None = None
+    ) -> str:
+        '''Второй этап поиска: краткий ответ YandexGPT по текстам, найденным
+        retrieve.
+
+        Args:
+            query: запрос после prepare_text (результат retrieve), повторно
+            не подготавливается.
+            contexts: тексты найденных документов (результат retrieve).
+            on_chunk: функция, в которую по мере генерации передаётся
+            сформированная часть краткого ответа (None - без потоковой
+            передачи).
+            is_cancelled: функция, возвращающая True, если ответ больше не
+            нужен.
+            mode: способ формирования ответа: per_document или packed (None -
+            способ, заданный при создании My_search).
+
+        Returns:
+            str: краткий ответ, сформированный gpt.'''
+        return self.__get_answer__(
+            query=query,
+            context_texts=contexts,
+            on_chunk=on_chunk,
+            is_cancelled=is_cancelled,
+            mode=mode
+        )
+
+    def search_for_gui(
+            self,
+            query: str,
+            fields: list[str],
+            indices_names: list[str],
+            fuzziness: float = "AUTO",
+            num_of_responses: int = 10,
+            multi_search: bool = True,
+            on_chunk=None,
+            is_cancelled=None
+    ) -> (str, list[(str, str)]):
+        '''Функция формирования ответа для вывода его в gui (оба этапа
+        поиска: retrieve и answer).
+
+        Args:
+            query: запрос, по которому нужно найти информацию.
+            fields: наименования полей, по которым нужно производить поиск.
+            indices_names: наименования индексов, в которых необходимо производить поиск.
+            fuzziness: количество ошибок, которое можно сделать при сопоставлении слов.
+            num_of_responses: количество ответов, которые нужно вывести в качестве ответа
+            на запрос.
+            multi_search: отправить BM25 и kNN запросы одним _msearch запросом
+            (True) или выполнить их последовательно (False).
+            on_chunk: функция, в которую по мере генерации передаётся
+            сформированная часть краткого ответа (None - без потоковой
+            передачи).
+            is_cancelled: функция, возвращающая True, если ответ больше не
+            нужен.
+
+        Returns:
+            (str, list[(str, str)]): возвращает кортеж (краткий ответ, сформированный gpt;
+            поисковая выдача).'''
+        documents, contexts, prepared_query = self.retrieve(
+            query, fields, indices_names, fuzziness, num_of_responses, multi_search
+        )
+        quick_answer = self.answer(prepared_query, contexts, on_chunk=on_chunk, is_cancelled=is_cancelled)
+
         return quick_answer, documents
 
     # def search_for_gui(
@@ -0,0 +1,98 @@
+import os
+import json
+from bisect import bisect_left
+from elasticsearch import helpers
+
+
+class Prefix_Index:
+    '''Индекс подсказок по началу строки: отсортированный массив строк
+    (заголовков и тегов документов) в нижнем регистре и двоичный поиск по
+    нему. Подсказки ищутся в памяти, без обращения к Elasticsearch.'''
+    def __init__(self, entries: list[str] | None = None):
+        '''Функция инициализации.
+
+        Args:
+            entries: строки, которые можно подсказывать.'''
+        items = sorted({
+            (entry.lower(), entry) for entry in (entries or []) if entry
+        })
+        self.keys = [key for key, _ in items]
+        self.values = [value for _, value in items]
+
+    def __len__(self) -> int:
+        '''Количество строк в индексе.'''
+        return len(self.keys)
+
+    def suggest(self, prefix: str, limit: int = 8) -> list[str]:
+        '''Поиск строк, начинающихся с prefix (без учёта регистра).
+
+        Args:
+            prefix: начало строки.
+            limit: максимальное количество подсказок.
+
+        Returns:
+            list[str]: подсказки в алфавитном порядке.'''
+        prefix = " ".join(prefix.lower().split())
+        if not prefix:
+            return []
+
+        suggestions = []
+        position = bisect_left(self.keys, prefix)
+        while (
+            position < len(self.keys) and len(suggestions) < limit
+            and self.keys[position].startswith(prefix)
+        ):
+            suggestions.append(self.values[position])
+            position += 1
+
+        return suggestions
+
+    @classmethod
+    def from_elasticsearch(
+        cls, es, index_name: str, fields: list[str] = ["title", "tags"],
+        list_fields: list[str] = ["tags"]
+    ) -> "Prefix_Index":
+        '''Построение индекса по документам индекса Elasticsearch.
+
+        Args:
+            es: клиент Elasticsearch.
+            index_name: наименование индекса (значения полей берутся как есть,
+            поэтому подходит индекс со стандартным анализатором).
+            fields: поля документов, значения которых нужно подсказывать.
+            list_fields: поля из fields, в которых через запятую перечислено
+            несколько значений (например, теги).
+
+        Returns:
+            Prefix_Index: индекс подсказок.'''
+        entries = []
+        for hit in helpers.scan(es, index=index_name, query={"_source": fields}):
+            for field in fields:
+                value = hit["_source"].get(field)
+                if not isinstance(value, str):
+                    continue
+                parts = value.split(",") if field in list_fields else [value]
+                entries += [" ".join(part.split()) for part in parts]
+
+        return cls(entries)
+
+    def save(self, path: str) -> None:
+        '''Сохранение индекса в json файл.
+
+        Args:
+            path: путь к файлу.'''
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump(self.values, file, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "Prefix_Index":
+        '''Загрузка индекса из json файла.
+
+        Args:
+            path: путь к файлу.
+
+        Returns:
+            Prefix_Index: индекс подсказок.'''
+        with open(path, encoding="utf-8") as file:
+            return cls(json.load(file))
@@ -3,6 +3,26 @@ import re
 import string
 import spacy
 import numpy as np
+import time
+import shelve
+import dbm
+import threading
+from collections import OrderedDict
+
+# Версию нужно увеличивать при любом изменении результата подготовки текста,
+# от неё зависит ключ кеша подготовленного корпуса
+ANALYZER_VERSION = "1"
+MODELS_NAMES = {True: "en_core_web_sm", False: "ru_core_news_sm"}
+# Компоненты, не влияющие на lemma_, is_stop и is_punct
+LEAN_EXCLUDE = ["parser", "ner", "senter"]
+
+EXTRA_SPACES = re.compile(r"[ \n]+")
+FIRST_LETTER = re.compile(r"[a-zA-Zа-яА-Я]")
+EN_LETTER = re.compile(r"[A-Za-z]")
+# Кандидаты в буквы других алфавитов: символы \w, кроме цифр, подчёркивания
+# и английских букв (среди них встречаются и не буквы, например "²")
+OTHER_LETTER = re.compile(r"[^\W\d_A-Za-z]")
+
 
 class Prepare_Text:
     '''Класс для подготовки текста перед загрузкой его в индекс.
@@ -10,12 +30,171 @@ class Prepare_Text:
     Есть два вида подготовки:
         1. Лёгкая версия: очитска от лишних пробелов и переносов строк;
         2. Полновесная версия: легкая версия + токенизация, очистка от стоп-слов, очистка от неалфавитных токенов.'''
-    def __init__(self):
+    def __init__(
+        self, n_process: int = 1, batch_size: int = 256, lean: bool = False,
+        lemma_cache_size: int = 0, lemma_dictionary_path: str | None = None,
+        lemma_dictionary_read_only: bool = False
+    ):
         '''Функция инициализации.
 
-        Загружает языковые пакеты библиотеки SpaCy.'''
-        self.nlp_en = spacy.load("en_core_web_sm")
-        self.nlp_ru = spacy.load("ru_core_news_sm")
+        Загружает языковые пакеты библиотеки SpaCy. В облегчённом режиме
+        (lean=True) пакеты загружаются только при первом использовании и без
+        компонентов, не нужных для лемматизации (синтаксический анализ,
+        распознавание именованных сущностей).
+
+        Если задан lemma_cache_size или lemma_dictionary_path, включается
+        словарь "словоформа -> лемма": фрагменты текста, все токены которых
+        уже встречались, лемматизируются по словарю без нейросетевого
+        конвейера SpaCy (лемма берётся без учёта контекста). Словарь состоит
+        из LRU кеша в памяти и, если задан путь, словаря на диске, который
+        пополняется по мере обработки корпуса. Словарь на диске не защищён
+        от одновременной записи из нескольких процессов, поэтому при
+        обработке запросов его нужно открывать только для чтения
+        (lemma_dictionary_read_only=True): новые словоформы запросов тогда
+        запоминаются только в кеше в памяти.
+
+        Args:
+            n_process: количество процессов, в которых выполняется обработка
+            DataFrame. Процессы запускаются (и получают копию языкового
+            пакета) при каждом вызове prepare_chunk, по одному набору на язык
+            для всех обрабатываемых столбцов сразу, поэтому несколько
+            процессов выгодны только при больших пачках.
+            batch_size: количество фрагментов текста, передаваемых в SpaCy
+            за один раз при обработке DataFrame.
+            lean: облегчённый режим загрузки языковых пакетов.
+            lemma_cache_size: размер LRU кеша лемм в памяти.
+            lemma_dictionary_path: путь к словарю лемм на диске.
+            lemma_dictionary_read_only: открыть словарь на диске только для
+            чтения (если словаря ещё нет, используется только кеш в памяти).'''
+        self.n_process = n_process
+        self.batch_size = batch_size
+        self.lean = lean
+        self.models = {}
+        self.stats = {"load_seconds": {}, "tokens": 0, "cached_tokens": 0, "seconds": 0.0}
+
+        self.use_lemma_cache = lemma_cache_size > 0 or lemma_dictionary_path is not None
+        self.lemma_cache_size = max(lemma_cache_size, 1)
+        self.lemma_cache = OrderedDict()
+        self.lemma_dictionary_read_only = lemma_dictionary_read_only
+        self.lemma_dictionary = None
+        if lemma_dictionary_path and lemma_dictionary_read_only:
+            try:
+                self.lemma_dictionary = shelve.open(lemma_dictionary_path, flag="r")
+            except dbm.error:
+                print(f"Словарь лемм {lemma_dictionary_path} не найден, используется только кеш в памяти")
+        elif lemma_dictionary_path:
+            self.lemma_dictionary = shelve.open(lemma_dictionary_path)
+        self.lemma_lock = threading.Lock()
+
+        if not lean:
+            for is_en in MODELS_NAMES:
+                self.__get_model__(is_en)
+
+    @property
+    def nlp_en(self):
+        '''Языковой пакет SpaCy для английского языка.'''
+        return self.__get_model__(True)
+
+    @property
+    def nlp_ru(self):
+        '''Языковой пакет SpaCy для русского языка.'''
+        return self.__get_model__(False)
+
+    def __get_model__(self, is_en: bool):
+        '''Возвращает языковой пакет SpaCy, загружая его при первом обращении.
+
+        Args:
+            is_en: True - английский пакет, False - русский.
+
+        Returns:
+            загруженный языковой пакет SpaCy.'''
+        name = MODELS_NAMES[is_en]
+        if name not in self.models:
+            start = time.perf_counter()
+            self.models[name] = spacy.load(name, exclude=LEAN_EXCLUDE if self.lean else [])
+            self.stats["load_seconds"][name] = time.perf_counter() - start
+
+        return self.models[name]
+
+    def profile_report(self) -> dict:
+        '''Отчёт о стоимости работы языковых пакетов SpaCy.
+
+        Returns:
+            dict: время загрузки каждого пакета (в секундах), количество
+            обработанных токенов и среднее время обработки одного токена
+            (в микросекундах).'''
+        tokens = self.stats["tokens"] + self.stats["cached_tokens"]
+        return {
+            "lean": self.lean,
+            "load_seconds": dict(self.stats["load_seconds"]),
+            "tokens": tokens,
+            "cached_tokens": self.stats["cached_tokens"],
+            "microseconds_per_token": self.stats["seconds"] / tokens * 1e6 if tokens else 0.0
+        }
+
+    def version(self) -> str:
+        '''Версия подготовки текста с учётом настроек, влияющих на результат.
+
+        Returns:
+            str: строка версии.'''
+        return f"{ANALYZER_VERSION}-lemma-cache" if self.use_lemma_cache else ANALYZER_VERSION
+
+    def save_lemma_dictionary(self) -> None:
+        '''Сохранение накопленных лемм в словарь на диске.'''
+        if self.lemma_dictionary is not None and not self.lemma_dictionary_read_only:
+            with self.lemma_lock:
+                self.lemma_dictionary.sync()
+
+    def __lookup_lemma__(self, is_en: bool, form: str) -> str | None:
+        '''Поиск леммы словоформы в кеше и словаре на диске.
+
+        Args:
+            is_en: True - английская словоформа, False - русская.
+            form: словоформа (текст токена).
+
+        Returns:
+            str | None: лемма (пустая строка, если токен отбрасывается
+            __filter_tokens__) или None, если словоформа неизвестна.'''
+        key = f"{MODELS_NAMES[is_en]}:{form}"
+        with self.lemma_lock:
+            if key in self.lemma_cache:
+                self.lemma_cache.move_to_end(key)
+                return self.lemma_cache[key]
+
+            if self.lemma_dictionary is None or key not in self.lemma_dictionary:
+                return None
+            lemma = self.lemma_dictionary[key]
+            self.__cache_lemma__(key, lemma)
+
+        return lemma
+
+    def __remember_lemma__(self, is_en: bool, form: str, lemma: str) -> None:
+        '''Запоминание леммы словоформы в кеше и словаре на диске (если
+        словарь открыт только для чтения - только в кеше).
+
+        Args:
+            is_en: True - английская словоформа, False - русская.
+            form: словоформа (текст токена).
+            lemma: лемма (пустая строка, если токен отбрасывается).'''
+        key = f"{MODELS_NAMES[is_en]}:{form}"
+        with self.lemma_lock:
+            self.__cache_lemma__(key, lemma)
+            if (
+                self.lemma_dictionary is not None and not self.lemma_dictionary_read_only
+                and key not in self.lemma_dictionary
+            ):
+                self.lemma_dictionary[key] = lemma
+
+    def __cache_lemma__(self, key: str, lemma: str) -> None:
+        '''Добавление леммы в LRU кеш с вытеснением самой старой записи.
+
+        Args:
+            key: ключ словоформы.
+            lemma: лемма.'''
+        self.lemma_cache[key] = lemma
+        self.lemma_cache.move_to_end(key)
+        if len(self.lemma_cache) > self.lemma_cache_size:
+            self.lemma_cache.popitem(last=False)
 
     def light_prepare_text(self, text: str) -> str:
         '''Функция для облегчённой подготовки (удаление лишних пробелов
@@ -52,22 +231,41 @@ class Prepare_Text:
         docs = docs.fillna("")
         docs = docs.astype(str)
 
-        for row in range(num_of_docs):
-            for column in docs.columns:
-                if type(docs.loc[row, column]
-                       ) == str and len(docs.loc[row, column]) > 0:
-                    docs.loc[
-                        row,
-                        column] = self.__remove_extra_spaces_and_line_breaks__(
-                            docs.loc[row, column]
-                        )
-                else:
-                    docs.loc[row, column] = ""
+        # Очищаются первые num_of_docs строк, все столбцы сразу
+        docs.iloc[:num_of_docs] = docs.iloc[:num_of_docs].apply(self.__light_prepare_column__)
 
         docs = docs.replace(['', ' '], np.nan).dropna(how='all').reset_index(drop=True)
 
         return docs
 
+    def light_prepare_chunk(self, docs: pd.DataFrame) -> pd.DataFrame:
+        '''Облегчённая подготовка (удаление лишних пробелов и переносов
+        строк) пачки документов, прочитанной из файла. В отличие от
+        light_prepare_docs строки не удаляются, чтобы пачка оставалась
+        согласованной с результатом prepare_chunk.
+
+        Args:
+            docs: pandas DataFrame с документами.
+
+        Returns:
+            pd.DataFrame: подготовленный DataFrame, все ячейки которого строки.'''
+        docs = docs.fillna("")
+        docs = docs.astype(str)
+        docs = docs.replace(['nan', 'NaN', 'null', 'None'], '')
+
+        return docs.apply(self.__light_prepare_column__)
+
+    def __light_prepare_column__(self, column: pd.Series) -> pd.Series:
+        '''Векторизованная облегчённая подготовка столбца строк (результат
+        совпадает с поячеечным применением light_prepare_text).
+
+        Args:
+            column: столбец pandas DataFrame, все ячейки которого строки.
+
+        Returns:
+            pd.Series: столбец без лишних пробелов и переносов строк.'''
+        return column.str.replace(EXTRA_SPACES, " ", regex=True).str.strip()
+
     def prepare_text(self, text: str) -> str:
         '''Функция для полноценной подготовки одной строки.
 
@@ -102,6 +300,23 @@ class Prepare_Text:
 
         return self.__processing__(docs, processing_columns)
 
+    def prepare_chunk(
+        self, docs: pd.DataFrame, processing_columns: list[str]
+    ) -> pd.DataFrame:
+        '''Полноценная подготовка пачки документов. Ожидается пачка,
+        уже прошедшая light_prepare_chunk, строки не удаляются.
+
+        Args:
+            docs: pandas DataFrame с документами.
+            processing_columns: список столбцов, которые нужно обработать.
+
+        Returns:
+            pd.DataFrame: DataFrame, ячейки столбцов processing_columns
+            которого подготовлены функцией __processing_cell__.'''
+        p_docs = docs.copy()
+        self.__processing_columns__(p_docs, processing_columns)
+
+        return p_docs
 
 
     def __first_is_en__(self, cell: str) -> bool:
@@ -113,18 +328,19 @@ class Prepare_Text:
         Returns:
             bool: возвращает True, если первый символ принадлежит английскому алфавиту,
             False в противном случае.'''
-        index_first_en = re.search(r"[a-zA-Z]", cell)
-        index_first_ru = re.search(r"[а-яА-Я]", cell)
+        first_letter = FIRST_LETTER.search(cell)
 
-        return True if index_first_en and (
-            not (index_first_ru) or
-            index_first_ru and index_first_en.start() < index_first_ru.start()
-        ) else False
+        return True if first_letter and first_letter.group() in string.ascii_letters else False
 
     def __split_into_en_and_ru__(self, cell: str) -> list[(bool, str)]:
         '''Разделяет строку на части, состоящие только из одного алфавита (русского
         или английскому.
 
+        Строка не собирается посимвольно: регулярное выражение находит
+        следующую букву другого алфавита (границу части), а части
+        вырезаются срезами исходной строки, поэтому время работы линейно по
+        длине строки, а число шагов равно числу частей.
+
         Args:
             cell: строка, которая будет разбиваться на части.
 
@@ -134,17 +350,23 @@ class Prepare_Text:
             указывает тип алфавита строки, а второе содержит подстроку исходной строки.'''
         parts = []
         is_en = self.__first_is_en__(cell)
-        part = ""
-        for symb in cell:
-            if is_en == (symb in string.ascii_letters) or not (symb.isalpha()):
-                part += symb
+        start = 0
+        while True:
+            if is_en:
+                boundary = OTHER_LETTER.search(cell, start)
+                while boundary and not boundary.group().isalpha():
+                    boundary = OTHER_LETTER.search(cell, boundary.end())
             else:
-                parts.append((is_en, part))
-                part = symb
-                is_en = not (is_en)
+                boundary = EN_LETTER.search(cell, start)
+            if boundary is None:
+                break
+
+            parts.append((is_en, cell[start:boundary.start()]))
+            start = boundary.start()
+            is_en = not is_en
 
-        if part:
-            parts.append((is_en, part))
+        if start < len(cell):
+            parts.append((is_en, cell[start:]))
 
         return parts
 
@@ -157,24 +379,87 @@ class Prepare_Text:
 
         Returns:
             str: возвращает очищенную от лишних пробелов и переносов строку.'''
-        processed = ""
-
         if type(text) != str or len(text) == 0:
             return ""
 
-        flag = True
-        for symb in text:
-            if flag and (symb == " " or symb == "\n"):
-                processed += " "
-                flag = False
+        return EXTRA_SPACES.sub(" ", text).strip()
 
-            if symb != " " and symb != "\n":
-                flag = True
+    def __filter_tokens__(self, doc) -> list[str]:
+        '''Отбор лемм из обработанного SpaCy фрагмента текста.
 
-            if flag:
-                processed += symb
+        Args:
+            doc: результат обработки фрагмента текста языковым пакетом SpaCy.
 
-        return processed.strip()
+        Returns:
+            list[str]: леммы токенов, не являющихся стоп-словами и знаками
+            препинания, длиной больше одного символа.'''
+        return [lemma for lemma in map(self.__token_lemma__, doc) if lemma]
+
+    def __token_lemma__(self, token) -> str:
+        '''Лемма одного токена SpaCy.
+
+        Args:
+            token: токен SpaCy.
+
+        Returns:
+            str: лемма токена или пустая строка, если токен является
+            стоп-словом, знаком препинания или короче двух символов.'''
+        if not (token.is_stop) and not (token.is_punct) and len(token.lemma_) > 1:
+            return token.lemma_
+        return ""
+
+    def __lemmatize__(
+        self, is_en: bool, texts: list[str], n_process: int = 1
+    ) -> list[list[str]]:
+        '''Лемматизация фрагментов текста одного алфавита языковым пакетом
+        SpaCy с учётом времени работы и количества токенов. Если включён
+        словарь лемм, фрагменты из известных словоформ обрабатываются только
+        токенизатором, а леммы остальных фрагментов запоминаются.
+
+        Args:
+            is_en: True - фрагменты на английском, False - на русском.
+            texts: фрагменты текста.
+            n_process: количество процессов для nlp.pipe.
+
+        Returns:
+            list[list[str]]: леммы (__filter_tokens__) каждого фрагмента.'''
+        if not texts:
+            return []
+
+        nlp = self.__get_model__(is_en)
+        start = time.perf_counter()
+
+        lemmas = [None] * len(texts)
+        unknown = list(range(len(texts)))
+        if self.use_lemma_cache:
+            unknown = []
+            for num, text in enumerate(texts):
+                # Фрагмент лемматизируется по словарю, только если известны
+                # все его словоформы, поэтому поиск прекращается на первой
+                # неизвестной (длинные фрагменты почти всегда идут в SpaCy)
+                known = []
+                for token in nlp.tokenizer(text):
+                    lemma = self.__lookup_lemma__(is_en, token.text)
+                    if lemma is None:
+                        unknown.append(num)
+                        break
+                    known.append(lemma)
+                else:
+                    lemmas[num] = [lemma for lemma in known if lemma]
+                    self.stats["cached_tokens"] += len(known)
+
+        for num, doc in zip(unknown, nlp.pipe(
+            (texts[num] for num in unknown), n_process=n_process, batch_size=self.batch_size
+        )):
+            lemmas[num] = self.__filter_tokens__(doc)
+            self.stats["tokens"] += len(doc)
+            if self.use_lemma_cache:
+                for token in doc:
+                    self.__remember_lemma__(is_en, token.text, self.__token_lemma__(token))
+
+        self.stats["seconds"] += time.perf_counter() - start
+
+        return lemmas
 
     def __processing_cell__(self, cell: str) -> str:
         '''Обработка одной ячейки pandas DataFrame.
@@ -193,23 +478,65 @@ class Prepare_Text:
         tokens = []
 
         for part in parts:
-            if part[0]:
-                tokens += [
-                    token.lemma_
-                    for token in self.nlp_en(part[1])
-                    if not (token.is_stop) and not (token.is_punct) and
-                    len(token.lemma_) > 1
-                ]
-            else:
-                tokens += [
-                    token.lemma_
-                    for token in self.nlp_ru(part[1])
-                    if not (token.is_stop) and not (token.is_punct) and
-                    len(token.lemma_) > 1
-                ]
+            tokens += self.__lemmatize__(part[0], [part[1]])[0]
 
         return " ".join(tokens) if tokens else ""
 
+    def __processing_cells__(self, cells: list[str]) -> list[str]:
+        '''Обработка списка ячеек (например, столбца pandas DataFrame).
+        Результат совпадает с поячеечным применением __processing_cell__,
+        но фрагменты текста всех ячеек передаются в SpaCy пачками через
+        nlp.pipe, в том числе в нескольких процессах (n_process).
+
+        Args:
+            cells: ячейки, которые нужно обработать.
+
+        Returns:
+            list[str]: обработанные ячейки в том же порядке.'''
+        cells_parts = [
+            self.__split_into_en_and_ru__(
+                self.__remove_extra_spaces_and_line_breaks__(cell)
+            )
+            for cell in cells
+        ]
+
+        texts = {True: [], False: []}
+        for parts in cells_parts:
+            for is_en, text in parts:
+                texts[is_en].append(text)
+
+        lemmas = {
+            is_en: iter(self.__lemmatize__(is_en, texts[is_en], n_process=self.n_process))
+            for is_en in texts
+        }
+
+        processed = []
+        for parts in cells_parts:
+            tokens = []
+            for is_en, _ in parts:
+                tokens += next(lemmas[is_en])
+            processed.append(" ".join(tokens) if tokens else "")
+
+        return processed
+
+    def __processing_columns__(self, data: pd.DataFrame, processing_columns: list[str]) -> None:
+        '''Обработка нескольких столбцов pandas DataFrame на месте. Ячейки
+        всех столбцов обрабатываются одним вызовом __processing_cells__,
+        поэтому nlp.pipe (и его процессы) запускается один раз на язык, а не
+        на каждый столбец.
+
+        Args:
+            data: pandas DataFrame, который нужно обработать.
+            processing_columns: список столбцов, которые нужно обработать.'''
+        num_of_rows = data.shape[0]
+        cells = []
+        for column in processing_columns:
+            cells += list(data[column])
+
+        processed = self.__processing_cells__(cells)
+        for num, column in enumerate(processing_columns):
+            data[column] = processed[num * num_of_rows:(num + 1) * num_of_rows]
+
     def __processing__(
         self, data: pd.DataFrame, processing_columns: list[str]
     ) -> pd.DataFrame:
@@ -227,10 +554,7 @@ class Prepare_Text:
 
         p_data = data.copy(deep=True)
         p_data.fillna("", inplace=True)
-
-        for row in range(p_data.shape[0]):
-            for column in processing_columns:
-                p_data.loc[row, column] = self.__processing_cell__(p_data.loc[row, column])
+        self.__processing_columns__(p_data, processing_columns)
 
         p_data = p_data.replace(['', ' '], np.nan).dropna(how='all').reset_index(drop=True)
 
@@ -0,0 +1,131 @@
+import os
+import json
+import hashlib
+import pandas as pd
+import pyarrow.parquet as pq
+from openpyxl import load_workbook
+
+
+SUPPORTED_FORMATS = [".xlsx", ".csv", ".jsonl", ".parquet"]
+
+
+def file_hash(path: str) -> str:
+    '''Хеш содержимого файла (файл читается блоками, поэтому размер
+    файла не ограничен объёмом памяти).
+
+    Args:
+        path: путь к файлу.
+
+    Returns:
+        str: sha1 хеш содержимого файла.'''
+    file_sha1 = hashlib.sha1()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            file_sha1.update(block)
+
+    return file_sha1.hexdigest()
+
+
+def _read_xlsx_rows(path: str):
+    '''Построчное чтение excel файла без загрузки всей таблицы в память.
+
+    Args:
+        path: путь к excel файлу.
+
+    Returns:
+        генератор словарей (столбец, значение), первая строка таблицы
+        считается заголовком.'''
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        for values in rows:
+            yield dict(zip(header, values))
+    finally:
+        workbook.close()
+
+
+def _read_jsonl_rows(path: str):
+    '''Построчное чтение jsonl файла.
+
+    Args:
+        path: путь к jsonl файлу.
+
+    Returns:
+        генератор словарей (поле, значение), пустые строки пропускаются.'''
+    with open(path, encoding="utf-8") as file:
+        for line in file:
+            if line.strip():
+                yield json.loads(line)
+
+
+def _rows_to_chunks(rows, columns: list[str], chunk_size: int):
+    '''Группирует строки в pandas DataFrame фиксированного размера.
+
+    Args:
+        rows: итерируемый набор словарей (столбец, значение).
+        columns: столбцы, которые нужно оставить.
+        chunk_size: количество строк в одной пачке.
+
+    Returns:
+        генератор pandas DataFrame (последняя пачка может быть меньше).'''
+    buffer = []
+    for row in rows:
+        buffer.append([row.get(column) for column in columns])
+        if len(buffer) == chunk_size:
+            yield pd.DataFrame(buffer, columns=columns)
+            buffer = []
+
+    if buffer:
+        yield pd.DataFrame(buffer, columns=columns)
+
+
+def read_docs_chunks(
+    path: str, columns: list[str], chunk_size: int = 1000,
+    num_of_docs: int | None = None
+):
+    '''Потоковое чтение документов из файла пачками фиксированного размера.
+    В памяти одновременно находится только одна пачка, поэтому размер
+    загружаемого корпуса не ограничен объёмом памяти.
+
+    Поддерживаемые форматы: xlsx, csv, jsonl, parquet (формат определяется
+    по расширению файла).
+
+    Args:
+        path: путь к файлу с документами.
+        columns: столбцы, которые нужно загрузить.
+        chunk_size: количество строк в одной пачке.
+        num_of_docs: сколько строк загрузить из файла (None - все строки).
+
+    Returns:
+        генератор pandas DataFrame со столбцами columns и индексом,
+        начинающимся с нуля в каждой пачке.'''
+    extension = os.path.splitext(path)[1].lower()
+
+    if extension == ".xlsx":
+        chunks = _rows_to_chunks(_read_xlsx_rows(path), columns, chunk_size)
+    elif extension == ".csv":
+        chunks = pd.read_csv(path, usecols=columns, chunksize=chunk_size)
+    elif extension == ".jsonl":
+        chunks = _rows_to_chunks(_read_jsonl_rows(path), columns, chunk_size)
+    elif extension == ".parquet":
+        chunks = (
+            batch.to_pandas() for batch in
+            pq.ParquetFile(path).iter_batches(batch_size=chunk_size, columns=columns)
+        )
+    else:
+        raise ValueError(
+            f"Неподдерживаемый формат файла: {extension}. Поддерживаются: {', '.join(SUPPORTED_FORMATS)}"
+        )
+
+    num_of_read = 0
+    for chunk in chunks:
+        if num_of_docs is not None:
+            if num_of_read >= num_of_docs:
+                break
+            chunk = chunk.iloc[:num_of_docs - num_of_read]
+        num_of_read += chunk.shape[0]
+
+        yield chunk.loc[:, columns].reset_index(drop=True)
@@ -1,34 +1,165 @@
 import aiohttp
 import asyncio
 import json
+import queue
+import threading
 
 folder_id = "<ваше значение>"
 yandexgpt_api_key = "<ваше значение>"
 yandex_gpt_api_url = "<ваше значение>"
 
+# Максимальное количество одновременных соединений с YandexGPT
+CONNECTIONS_LIMIT = 16
+# Как часто (в секундах) проверяется отмена параллельных запросов
+CANCEL_CHECK_SECONDS = 0.1
+
+_loop = None
+_loop_lock = threading.Lock()
+_session = None
+
+
+def _get_loop() -> asyncio.AbstractEventLoop:
+    '''Цикл событий, работающий в отдельном потоке всё время работы
+    программы. В нём выполняются все запросы к YandexGPT, поэтому сессия
+    и её пул соединений переиспользуются между запросами.
+
+    Returns:
+        asyncio.AbstractEventLoop: цикл событий.'''
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, daemon=True).start()
+        return _loop
+
+
+def run(coroutine):
+    '''Выполнение корутины в общем цикле событий и ожидание результата.
+
+    Args:
+        coroutine: корутина.
+
+    Returns:
+        результат корутины.'''
+    return asyncio.run_coroutine_threadsafe(coroutine, _get_loop()).result()
+
+
+def iterate(async_generator):
+    '''Обход асинхронного генератора из обычного кода: генератор
+    выполняется в общем цикле событий, его элементы передаются в
+    вызывающий поток по мере появления. Если обход прервать, генератор
+    отменяется.
+
+    Args:
+        async_generator: асинхронный генератор.
+
+    Returns:
+        генератор элементов async_generator.'''
+    items = queue.Queue()
+
+    async def pump():
+        try:
+            async for item in async_generator:
+                items.put(("item", item))
+        except Exception as e:
+            items.put(("error", e))
+        finally:
+            items.put(("done", None))
+
+    future = asyncio.run_coroutine_threadsafe(pump(), _get_loop())
+    try:
+        while True:
+            kind, value = items.get()
+            if kind == "done":
+                break
+            if kind == "error":
+                raise value
+            yield value
+    finally:
+        future.cancel()
+
+
+def close() -> None:
+    '''Закрытие сессии с YandexGPT.'''
+    global _session
+    if _session is not None:
+        run(_session.close())
+        _session = None
+
+
+async def _get_session() -> aiohttp.ClientSession:
+    '''Общая для всех запросов сессия с пулом соединений (создаётся при
+    первом запросе).
+
+    Returns:
+        aiohttp.ClientSession: сессия.'''
+    global _session
+    if _session is None or _session.closed:
+        _session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=CONNECTIONS_LIMIT))
+    return _session
+
 
 async def yandex_gpt(messages: list):
-    async with aiohttp.ClientSession() as session:
-        async with session.post(
-                yandex_gpt_api_url,
-                headers={
-                    "Authorization": f"Api-Key {yandexgpt_api_key}",
-                    "x-folder-id": folder_id
+    session = await _get_session()
+    async with session.post(
+            yandex_gpt_api_url,
+            headers={
+                "Authorization": f"Api-Key {yandexgpt_api_key}",
+                "x-folder-id": folder_id
+            },
+            json={
+                "modelUri": f"gpt://{folder_id}/yandexgpt/latest",
+                "completionOptions": {
+                    "stream": False,
+                    "temperature": 0.2
                 },
-                json={
-                    "modelUri": f"gpt://{folder_id}/yandexgpt/latest",
-                    "completionOptions": {
-                        "stream": False,
-                        "temperature": 0.2
-                    },
-                    "messages": messages
-                }
-        ) as response:
-            return await response.json()
+                "messages": messages
+            }
+    ) as response:
+        return await response.json()
 
 
-async def get_short_answer(prompt: str, document: str, question: str) -> str:
-    messages = [
+async def yandex_gpt_stream(messages: list, cumulative: bool = True):
+    '''Потоковый запрос к YandexGPT: ответ приходит частями по мере
+    генерации (по одному json объекту на строку).
+
+    Args:
+        messages: сообщения.
+        cumulative: каждая часть содержит весь текст ответа на текущий
+        момент (так отвечает YandexGPT); False - каждая часть содержит
+        только продолжение текста.
+
+    Returns:
+        асинхронный генератор текста ответа, сформированного на текущий
+        момент (каждый следующий элемент продолжает предыдущий).'''
+    session = await _get_session()
+    async with session.post(
+            yandex_gpt_api_url,
+            headers={
+                "Authorization": f"Api-Key {yandexgpt_api_key}",
+                "x-folder-id": folder_id
+            },
+            json={
+                "modelUri": f"gpt://{folder_id}/yandexgpt/latest",
+                "completionOptions": {
+                    "stream": True,
+                    "temperature": 0.2
+                },
+                "messages": messages
+            }
+    ) as response:
+        text = ""
+        async for line in response.content:
+            if not line.strip():
+                continue
+            chunk = json.loads(line)
+            chunk_text = chunk['result']['alternatives'][0]['message']['text']
+            text = chunk_text if cumulative else text + chunk_text
+            yield text
+
+
+def _make_messages(prompt: str, document: str, question: str) -> list:
+    return [
         {
             "role": "system",
             "text": f"{prompt}"
@@ -43,5 +174,58 @@ async def get_short_answer(prompt: str, document: str, question: str) -> str:
         }
     ]
 
-    response = await yandex_gpt(messages)
+
+async def get_short_answer(prompt: str, document: str, question: str) -> str:
+    response = await yandex_gpt(_make_messages(prompt, document, question))
     return response['result']['alternatives'][0]['message']['text']
+
+
+async def get_short_answer_stream(prompt: str, document: str, question: str, cumulative: bool = True):
+    '''Потоковое формирование ответа на вопрос по документу.
+
+    Args:
+        prompt: системный промпт.
+        document: документ.
+        question: вопрос.
+        cumulative: формат частей ответа (см. yandex_gpt_stream).
+
+    Returns:
+        асинхронный генератор текста ответа, сформированного на текущий
+        момент.'''
+    async for text in yandex_gpt_stream(_make_messages(prompt, document, question), cumulative):
+        yield text
+
+
+async def get_short_answers(
+    prompt: str, documents: list[str], question: str, max_concurrency: int = 4,
+    is_cancelled=None
+) -> list[str | BaseException]:
+    '''Параллельное формирование ответов на вопрос по нескольким документам.
+
+    Args:
+        prompt: системный промпт.
+        documents: документы.
+        question: вопрос.
+        max_concurrency: максимальное количество одновременных запросов.
+        is_cancelled: функция, возвращающая True, если ответы больше не
+        нужны: выполняющиеся и ожидающие очереди запросы отменяются.
+
+    Returns:
+        list[str | BaseException]: ответы в порядке документов (исключение
+        вместо ответа, если запрос по документу не удался или отменён).'''
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def get_answer(document: str) -> str:
+        async with semaphore:
+            return await get_short_answer(prompt, document, question)
+
+    tasks = [asyncio.ensure_future(get_answer(document)) for document in documents]
+    if is_cancelled is not None:
+        while not all(task.done() for task in tasks):
+            await asyncio.wait(tasks, timeout=CANCEL_CHECK_SECONDS)
+            if is_cancelled():
+                for task in tasks:
+                    task.cancel()
+                break
+
+    return await asyncio.gather(*tasks, return_exceptions=True)
@@ -1,13 +1,20 @@
+import queue
+import threading
 import tkinter as tk
 from tkinter import ttk
 from typing import List, Tuple
 from src.backend.index import My_search
+from src.backend.prefix_index import Prefix_Index
+import os
 import webbrowser
 
 
 class SearchGUI:
     '''Класс графического интерфейса приложения.'''
-    def __init__(self, master, search: My_search, indices_names: List[str]):
+    def __init__(
+        self, master, search: My_search, indices_names: List[str],
+        prefix_index_path: str | None = None
+    ):
         '''Функция инициализации.
 
         Args:
@@ -15,7 +22,9 @@ class SearchGUI:
             search: экземпляр класса My_search для взаимодействия
             с Elasticsearch.
             indices_names: наименования индексов, которые присутствуют в
-            Elasticsearch.'''
+            Elasticsearch.
+            prefix_index_path: файл индекса подсказок (My_search.build_prefix_index),
+            если его нет, подсказки не показываются.'''
         self.master = master
         master.title("ElasticSearch Results")
         master.configure(bg='white')
@@ -29,6 +38,24 @@ class SearchGUI:
         self.fuzziness = 1
         self.num_of_responses = 15
         self.fields = ["title^2", "summary^2", "content"]
+        # Количество документов на одной странице выдачи
+        self.page_size = 10
+
+        # Выдача и текущая страница
+        self.documents = []
+        self.page = 0
+
+        # Поиск при вводе: выдача обновляется, когда пользователь перестал
+        # печатать на debounce_ms миллисекунд, подсказки - сразу
+        self.debounce_ms = 300
+        self.debounce_id = None
+        # Текст, по которому последним запущен (или запланирован) поиск:
+        # клавиши, не меняющие текст, поиск не запускают
+        self.last_query = None
+        self.num_of_suggestions = 8
+        self.prefix_index = Prefix_Index()
+        if prefix_index_path and os.path.exists(prefix_index_path):
+            self.prefix_index = Prefix_Index.load(prefix_index_path)
 
         # Инициализация UI
         self.create_search_frame()
@@ -38,6 +65,15 @@ class SearchGUI:
 
         # Состояние UI
         self.loading_label = None
+        # Номер последнего запроса: ответы на предыдущие запросы отменяются
+        self.search_generation = 0
+        # Поиск выполняется в отдельном потоке (search_worker), задания
+        # передаются ему через очередь search_jobs, результаты - в окно через
+        # очередь results_queue, которую периодически проверяет poll_results
+        self.search_jobs = queue.Queue()
+        self.results_queue = queue.Queue()
+        threading.Thread(target=self.search_worker, daemon=True).start()
+        self.poll_id = self.master.after(50, self.poll_results)
         self.answer_visible = False
         self.results_visible = False
 
@@ -50,9 +86,23 @@ class SearchGUI:
         '''Создает панель поиска'''
         search_frame = tk.Frame(self.master, bg='white')
         search_frame.pack(fill='x', padx=10, pady=10)
+        self.search_frame = search_frame
 
         self.entry = tk.Entry(search_frame, width=50)
         self.entry.pack(side='left', fill='x', expand=True, padx=(0, 5))
+        self.entry.bind("<KeyRelease>", self.on_key_release)
+        self.entry.bind("<Return>", lambda e: self.perform_search())
+
+        # Подсказки (показываются под строкой поиска)
+        self.suggestions = tk.Listbox(
+            self.master,
+            height=self.num_of_suggestions,
+            relief='solid',
+            bd=1,
+            font=('Arial', 10),
+            activestyle='none'
+        )
+        self.suggestions.bind("<<ListboxSelect>>", self.on_suggestion_select)
 
         search_btn = tk.Button(
             search_frame,
@@ -63,29 +113,156 @@ class SearchGUI:
         )
         search_btn.pack(side='left')
 
+    def on_key_release(self, event):
+        '''Обработчик ввода в строку поиска: подсказки обновляются сразу,
+        поиск без краткого ответа запускается после паузы в наборе'''
+        if event.keysym == "Escape":
+            self.hide_suggestions()
+            return
+
+        # Shift, Ctrl+C, перемещение курсора и т.п. не меняют текст и не
+        # должны отменять уже выполняющийся поиск
+        query = self.entry.get()
+        if query == self.last_query:
+            return
+        self.last_query = query
+        self.show_suggestions(self.prefix_index.suggest(query, self.num_of_suggestions))
+
+        if self.debounce_id:
+            self.master.after_cancel(self.debounce_id)
+            self.debounce_id = None
+        if query.strip():
+            self.debounce_id = self.master.after(self.debounce_ms, self.perform_incremental_search)
+
+    def show_suggestions(self, suggestions: List[str]):
+        '''Показывает подсказки под строкой поиска'''
+        if not suggestions:
+            self.hide_suggestions()
+            return
+
+        self.suggestions.delete(0, 'end')
+        for suggestion in suggestions:
+            self.suggestions.insert('end', suggestion)
+        self.suggestions.configure(height=len(suggestions))
+        if not self.suggestions.winfo_manager():
+            self.suggestions.pack(after=self.search_frame, fill='x', padx=10)
+
+    def hide_suggestions(self):
+        '''Скрывает подсказки'''
+        self.suggestions.pack_forget()
+
+    def on_suggestion_select(self, event):
+        '''Обработчик выбора подсказки: подсказка становится запросом'''
+        selection = self.suggestions.curselection()
+        if not selection:
+            return
+
+        self.entry.delete(0, 'end')
+        self.entry.insert(0, self.suggestions.get(selection[0]))
+        self.perform_search()
+
+    def perform_incremental_search(self):
+        '''Поиск при вводе: только поисковая выдача, без краткого ответа.
+        Отменяет выполняющийся поиск.'''
+        self.debounce_id = None
+        self.search_generation += 1
+        self.search_jobs.put((self.search_generation, self.entry.get(), False))
+
     def perform_search(self):
-        '''Обработчик поискового запроса'''
-        try:
-            self.show_loading()
-            query = self.entry.get()
+        '''Обработчик поискового запроса. Поиск запускается в отдельном
+        потоке, окно при этом продолжает отвечать на действия пользователя.
+        Новый запрос отменяет предыдущий.'''
+        if self.debounce_id:
+            self.master.after_cancel(self.debounce_id)
+            self.debounce_id = None
+        self.hide_suggestions()
+        self.last_query = self.entry.get()
+
+        self.search_generation += 1
+        self.show_loading()
+        self.search_jobs.put((self.search_generation, self.entry.get(), True))
+
+    def search_worker(self):
+        '''Поток поиска: выполняет задания из search_jobs по одному.
+        Задания, которые успели устареть (пользователь ввёл новый запрос),
+        пропускаются, поэтому одновременно выполняется не больше одного
+        поиска.'''
+        while True:
+            job = self.search_jobs.get()
+            # Из накопившихся заданий актуально только последнее
+            while not self.search_jobs.empty():
+                job = self.search_jobs.get_nowait()
+            if job is None:
+                return
+
+            generation, query, with_answer = job
+            if generation == self.search_generation:
+                self.run_search(generation, query, with_answer)
+
+    def run_search(self, generation: int, query: str, with_answer: bool = True):
+        '''Выполнение поиска (в потоке search_worker). Поисковая выдача, части
+        краткого ответа и сам ответ помещаются в очередь results_queue по
+        мере готовности: выдача показывается, не дожидаясь ответа.
 
-            # Выполнение поиска
-            quick_answer, documents = self.search.search_for_gui(
+        Args:
+            generation: номер запроса.
+            query: запрос.
+            with_answer: формировать краткий ответ (при поиске во время
+            ввода не формируется).'''
+        def is_cancelled():
+            return generation != self.search_generation
+
+        try:
+            documents, contexts, prepared_query = self.search.retrieve(
                 query=query,
                 fields=self.fields,
                 indices_names=self.indices_names,
                 fuzziness=self.fuzziness,
-                num_of_responses=self.num_of_responses
+                num_of_responses=self.num_of_responses,
+                with_contexts=with_answer
             )
-
-            # Обновление интерфейса
-            self.update_answer(quick_answer)
-            self.update_documents(documents)
-
+            self.results_queue.put((generation, "documents", documents))
+            if not with_answer:
+                self.results_queue.put((generation, "answer", ""))
+                return
+            if is_cancelled():
+                return
+
+            self.results_queue.put((generation, "answer", "Формируется краткий ответ..."))
+            quick_answer = self.search.answer(
+                query=prepared_query,
+                contexts=contexts,
+                on_chunk=lambda text: self.results_queue.put((generation, "answer", text)),
+                is_cancelled=is_cancelled
+            )
+            self.results_queue.put((generation, "answer", quick_answer))
         except Exception as e:
-            self.show_error(f"Ошибка поиска: {str(e)}")
-        finally:
-            self.hide_loading()
+            self.results_queue.put((generation, "error", f"Ошибка поиска: {str(e)}"))
+
+    def poll_results(self):
+        '''Перенос результатов поиска из очереди в окно. Результаты
+        отменённых запросов отбрасываются.'''
+        while True:
+            try:
+                generation, kind, value = self.results_queue.get_nowait()
+            except queue.Empty:
+                break
+            if generation != self.search_generation:
+                continue
+
+            if kind == "documents":
+                self.hide_loading()
+                self.update_documents(value)
+            elif kind == "answer":
+                self.update_answer(value)
+            else:
+                # Ошибка может произойти и при формировании краткого ответа,
+                # когда в блоке ответа уже выведена заглушка
+                self.hide_loading()
+                self.update_answer("")
+                self.show_error(value)
+
+        self.poll_id = self.master.after(50, self.poll_results)
 
     def create_quick_answer_frame(self):
         '''Создает блок с быстрым ответом'''
@@ -147,23 +324,56 @@ class SearchGUI:
         self.canvas.create_window((0, 0), window=self.scrollable_frame, anchor='nw')
         self.canvas.configure(yscrollcommand=scrollbar.set)
 
+        # Переключение страниц выдачи
+        pages_frame = tk.Frame(self.results_container, bg='white')
+        self.prev_btn = tk.Button(
+            pages_frame,
+            text="◀",
+            command=lambda: self.show_page(self.page - 1),
+            relief='flat',
+            bg='white'
+        )
+        self.page_label = tk.Label(pages_frame, bg='white', font=('Arial', 9))
+        self.next_btn = tk.Button(
+            pages_frame,
+            text="▶",
+            command=lambda: self.show_page(self.page + 1),
+            relief='flat',
+            bg='white'
+        )
+        self.prev_btn.pack(side='left')
+        self.page_label.pack(side='left', padx=5)
+        self.next_btn.pack(side='left')
+
+        pages_frame.pack(side='bottom', fill='x')
         self.canvas.pack(side='left', fill='both', expand=True)
         scrollbar.pack(side='right', fill='y')
 
-    def create_document_block(self, parent, link: str, content: str):
-        '''Создает блок документа'''
+        # Блоки документов создаются один раз и переиспользуются: при
+        # поиске и переключении страниц меняется только их содержимое
+        self.document_blocks = [
+            self.create_document_block(self.scrollable_frame)
+            for _ in range(self.page_size)
+        ]
+        self.no_results = tk.Label(
+            self.scrollable_frame,
+            text="Ничего не найдено",
+            bg='white',
+            font=('Arial', 10)
+        )
+
+    def create_document_block(self, parent):
+        '''Создает блок документа (без содержимого, заполняется в show_page)'''
         doc_frame = tk.Frame(
             parent,
             bd=1,
             relief='solid',
             bg='white'
         )
-        doc_frame.pack(fill='x', pady=5, padx=2)
 
         # Содержание документа
         content_label = tk.Label(
             doc_frame,
-            text=content,
             anchor='w',
             bg='white',
             wraplength=1200,
@@ -175,10 +385,8 @@ class SearchGUI:
         # 3.2 Выравнивание по левому краю
         link_btn = tk.Button(
             doc_frame,
-            text=link,
             fg='blue',
             cursor='hand2',
-            command=lambda: webbrowser.open(link),
             relief='flat',
             bg='white',
             font=('Arial', 9, 'underline'),
@@ -187,6 +395,8 @@ class SearchGUI:
         )
         link_btn.pack(fill='x', padx=5, pady=(0, 5), anchor='w')
 
+        return doc_frame, content_label, link_btn
+
     def update_answer(self, quick_answer: str):
         '''Обновляет блок с быстрым ответом'''
         self.answer_text.configure(state='normal')
@@ -202,33 +412,50 @@ class SearchGUI:
 
     def update_documents(self, documents: List[Tuple[str, str]]):
         '''Обновляет результаты поиска'''
-        # Очистка старых результатов
-        for widget in self.scrollable_frame.winfo_children():
-            widget.destroy()
-
-        # Добавление новых результатов
-        if documents:
-            for link, content in documents:
-                self.create_document_block(self.scrollable_frame, link, content)
-            self.toggle_visibility("results", True)
+        self.documents = documents
+        self.show_page(0)
+        self.toggle_visibility("results", True)
+
+    def show_page(self, page: int):
+        '''Показывает страницу выдачи в блоках документов'''
+        num_of_pages = max(1, -(-len(self.documents) // self.page_size))
+        self.page = min(max(page, 0), num_of_pages - 1)
+        page_documents = self.documents[self.page * self.page_size:(self.page + 1) * self.page_size]
+
+        if self.documents:
+            self.no_results.pack_forget()
         else:
-            no_results = tk.Label(
-                self.scrollable_frame,
-                text="Ничего не найдено",
-                bg='white',
-                font=('Arial', 10)
-            )
-            no_results.pack(pady=20)
-            self.toggle_visibility("results", True)
+            self.no_results.pack(pady=20)
+
+        # Показанные блоки всегда идут подряд с начала, поэтому порядок
+        # упаковки совпадает с порядком документов
+        for i, (doc_frame, content_label, link_btn) in enumerate(self.document_blocks):
+            if i < len(page_documents):
+                link, content = page_documents[i]
+                content_label.configure(text=content)
+                link_btn.configure(text=link, command=lambda link=link: webbrowser.open(link))
+                if not doc_frame.winfo_manager():
+                    doc_frame.pack(fill='x', pady=5, padx=2)
+            else:
+                doc_frame.pack_forget()
 
-        self.canvas.configure(scrollregion=self.canvas.bbox("all"))
+        self.page_label.configure(text=f"Страница {self.page + 1} из {num_of_pages}")
+        self.prev_btn.configure(state='normal' if self.page > 0 else 'disabled')
+        self.next_btn.configure(state='normal' if self.page < num_of_pages - 1 else 'disabled')
+        self.canvas.yview_moveto(0)
 
     def toggle_visibility(self, element: str, show: bool):
         '''Управляет видимостью элементов'''
         if element == "answer":
             if show:
-                # Теперь фрейм всегда физически упакован, управляем только видимостью
-                self.answer_frame.pack(side='top', pady=10, anchor='nw', fill='none')
+                # Теперь фрейм всегда физически упакован, управляем только видимостью.
+                # Ответ может прийти после выдачи, но располагается над ней
+                if self.results_visible:
+                    self.answer_frame.pack(
+                        side='top', pady=10, anchor='nw', fill='none', before=self.results_container
+                    )
+                else:
+                    self.answer_frame.pack(side='top', pady=10, anchor='nw', fill='none')
                 self.answer_frame.lift()  # Гарантируем положение поверх других элементов
             else:
                 self.answer_frame.pack_forget()
@@ -243,6 +470,8 @@ class SearchGUI:
 
     def show_loading(self):
         '''Показывает индикатор загрузки'''
+        if self.loading_label:
+            self.loading_label.destroy()
         self.toggle_visibility("answer", False)
         self.toggle_visibility("results", False)
 
@@ -253,13 +482,11 @@ class SearchGUI:
             font=('Arial', 10)
         )
         self.loading_label.pack(pady=20)
-        self.master.update()
 
     def hide_loading(self):
         '''Скрывает индикатор загрузки'''
         if self.loading_label:
             self.loading_label.pack_forget()
-            self.master.update()
 
     def show_error(self, message: str):
         '''Показывает сообщение об ошибке'''
@@ -276,4 +503,9 @@ class SearchGUI:
 
     def on_close(self):
         '''Обработчик закрытия окна'''
+        self.master.after_cancel(self.poll_id)
+        self.search_jobs.put(None)
+        if self.debounce_id:
+            self.master.after_cancel(self.debounce_id)
+        self.search.close()
         self.master.destroy()
\ No newline at end of file
@@ -11,8 +11,19 @@ INDICES_NAMES = [
 root = tk.Tk()
 app = SearchGUI(
     master=root,
-    search=My_search(host=HOST),
-    indices_names=INDICES_NAMES
+    search=My_search(
+        host=HOST,
+        lean=True,
+        lemma_cache_size=100000,
+        lemma_dictionary_path="../lemmas.db",
+        lemma_dictionary_read_only=True,
+        query_cache_size=1024,
+        query_cache_path="../query_embeddings.json",
+        llm_cache_path="../llm_answers.db",
+        answer_mode="per_document"
+    ),
+    indices_names=INDICES_NAMES,
+    prefix_index_path="../prefix_index.json"
 )
 root.geometry("1280x720")
 root.mainloop()
@@ -22,6 +33,11 @@ root.mainloop()
 # PROCESSING_COLUMNS = ["title", "summary", "content", "tags"]
 # HOST = "http://localhost:9200"
 # NUM_OF_DOCS = 10000
+# LEMMA_DICTIONARY_PATH = "../lemmas.db"
+# LEMMA_CACHE_SIZE = 100000
+# CORPUS_CACHE_DIR = "../corpus_cache"
+# EMBEDDING_STORE_PATH = "../embeddings"
+# PREFIX_INDEX_PATH = "../prefix_index.json"
 #
 # INDICES_NAMES = [
 #     "my_index_standart_analyzer",
@@ -82,6 +98,9 @@ root.mainloop()
 #                 "analyzer": "my_analyzer",
 #                 "search_analyzer": "my_analyzer"
 #             },
+#             "doc_id": {
+#                 "type": "keyword"
+#             },
 #             "content_embedding": {
 #                 "type": "dense_vector",
 #                 "dims": 384,
@@ -155,6 +174,9 @@ root.mainloop()
 #                 "analyzer": "ngram_analyzer",
 #                 "search_analyzer": "ngram_analyzer"
 #             },
+#             "doc_id": {
+#                 "type": "keyword"
+#             },
 #             "content_embedding": {
 #                 "type": "dense_vector",
 #                 "dims": 384,
@@ -198,6 +220,9 @@ root.mainloop()
 #             "true_tags": {
 #                 "type": "text"
 #             },
+#             "doc_id": {
+#                 "type": "keyword"
+#             },
 #             "content_embedding": {
 #                 "type": "dense_vector",
 #                 "dims": 384,
@@ -267,6 +292,9 @@ root.mainloop()
 #             "true_tags": {
 #                 "type": "text"
 #             },
+#             "doc_id": {
+#                 "type": "keyword"
+#             },
 #             "content_embedding": {
 #                 "type": "dense_vector",
 #                 "dims": 384,
@@ -283,7 +311,13 @@ root.mainloop()
 #     index_settings_custom_analyzer_ngramms
 # ]
 #
-# sr = My_search(host=HOST)
+# sr = My_search(
+#     host=HOST,
+#     lemma_cache_size=LEMMA_CACHE_SIZE,
+#     lemma_dictionary_path=LEMMA_DICTIONARY_PATH,
+#     corpus_cache_dir=CORPUS_CACHE_DIR,
+#     embedding_store_path=EMBEDDING_STORE_PATH
+# )
 
 
 # def init() -> None:
@@ -291,12 +325,36 @@ root.mainloop()
 #     sr.create_indices(indices_names=INDICES_NAMES, indices_settings=INDICES_SETTINGS)
 #
 #     sr.add_docs(
-#         path_excel_docs=DATA_PATH,
+#         path_docs=DATA_PATH,
+#         indices_names=INDICES_NAMES,
+#         fields=COLUMNS,
+#         processing_fields=PROCESSING_COLUMNS,
+#         num_of_docs=NUM_OF_DOCS
+#     )
+#     sr.build_prefix_index(index_name=INDICES_NAMES[0], path=PREFIX_INDEX_PATH)
+#
+#
+# def resume() -> None:
+#     sr.add_docs(
+#         path_docs=DATA_PATH,
+#         indices_names=INDICES_NAMES,
+#         fields=COLUMNS,
+#         processing_fields=PROCESSING_COLUMNS,
+#         num_of_docs=NUM_OF_DOCS,
+#         resume=True
+#     )
+#     sr.build_prefix_index(index_name=INDICES_NAMES[0], path=PREFIX_INDEX_PATH)
+#
+#
+# def sync() -> None:
+#     sr.sync_docs(
+#         path_docs=DATA_PATH,
 #         indices_names=INDICES_NAMES,
 #         fields=COLUMNS,
 #         processing_fields=PROCESSING_COLUMNS,
 #         num_of_docs=NUM_OF_DOCS
 #     )
+#     sr.build_prefix_index(index_name=INDICES_NAMES[0], path=PREFIX_INDEX_PATH)
 
 # while True:
 #     user_input = input("Введите команду\n>>> ")
@@ -354,4 +412,10 @@ root.mainloop()
     #     break
     #
     # if user_input.strip() == "init":
-    #     init()
\ No newline at end of file
+    #     init()
+    #
+    # if user_input.strip() == "resume":
+    #     resume()
+    #
+    # if user_input.strip() == "sync":
+    #     sync()
\ No newline at end of file
@@ -0,0 +1,109 @@
+'''Микробенчмарк функций подготовки текста Prepare_Text на столбце content
+корпуса: текущие реализации сравниваются с исходными посимвольными.
+
+Запуск из корня проекта:
+    python tests/benchmark_processing_text.py [путь к файлу документов] [количество документов]
+
+Если файл документов не найден, используются случайные тексты, похожие на
+новости по длине и составу.'''
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.backend.processing_text import Prepare_Text
+from src.backend.reader import read_docs_chunks
+from tests.test_processing_text import (
+    reference_remove_extra_spaces_and_line_breaks,
+    reference_split_into_en_and_ru
+)
+
+
+def load_contents(path: str, num_of_docs: int) -> list[str]:
+    '''Столбец content из файла документов или случайные тексты.
+
+    Args:
+        path: путь к файлу документов.
+        num_of_docs: количество документов.
+
+    Returns:
+        list[str]: тексты.'''
+    if os.path.exists(path):
+        contents = []
+        for chunk in read_docs_chunks(path, ["content"], num_of_docs=num_of_docs):
+            contents += [str(text) for text in chunk["content"].fillna("")]
+        return contents
+
+    # Как в новостях: в основном русские слова, изредка английские слова,
+    # числа, знаки препинания и переносы строк
+    print(f"Файл {path} не найден, используются случайные тексты")
+    generator = random.Random(0)
+    ru_letters = "абвгдеёжзийклмнопрстуфхцчшщъыьэюя"
+    en_letters = "abcdefghijklmnopqrstuvwxyz"
+    contents = []
+    for _ in range(num_of_docs):
+        words = []
+        for _ in range(generator.randint(100, 800)):
+            kind = generator.random()
+            if kind < 0.9:
+                word = "".join(generator.choices(ru_letters, k=generator.randint(2, 10)))
+            elif kind < 0.95:
+                word = "".join(generator.choices(en_letters, k=generator.randint(2, 10)))
+            else:
+                word = str(generator.randint(0, 2025))
+            words.append(word + generator.choice(["", "", "", ",", ".", "  ", "\n"]))
+        contents.append(" ".join(words))
+
+    return contents
+
+
+def measure(function, contents: list[str]) -> float:
+    '''Время обработки всех текстов (лучшее из трёх запусков).
+
+    Args:
+        function: функция подготовки одного текста.
+        contents: тексты.
+
+    Returns:
+        float: время в секундах.'''
+    best = None
+    for _ in range(3):
+        start = time.perf_counter()
+        for text in contents:
+            function(text)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    return best
+
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else "news.xlsx"
+    num_of_docs = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+
+    contents = load_contents(path, num_of_docs)
+    lengths = sorted(len(text) for text in contents)
+    print(
+        f"Документов: {len(contents)}, символов: {sum(lengths)}, "
+        f"медианная длина: {lengths[len(lengths) // 2] if lengths else 0}"
+    )
+
+    analyzer = Prepare_Text(lean=True)
+
+    def current(text):
+        return analyzer.__split_into_en_and_ru__(analyzer.__remove_extra_spaces_and_line_breaks__(text))
+
+    def reference(text):
+        return reference_split_into_en_and_ru(reference_remove_extra_spaces_and_line_breaks(text))
+
+    reference_seconds = measure(reference, contents)
+    current_seconds = measure(current, contents)
+    print(f"Исходные функции: {reference_seconds:.3f} с")
+    print(f"Текущие функции: {current_seconds:.3f} с")
+    print(f"Ускорение: {reference_seconds / current_seconds:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Тесты импортируют модули проекта как src.backend.*, как и main.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,31 @@
+import sqlite3
+
+from src.backend.cache import LLM_Cache
+
+
+def count_rows(path: str) -> int:
+    with sqlite3.connect(path) as connection:
+        return connection.execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+
+
+def test_llm_cache_eviction(tmp_path):
+    path = str(tmp_path / "answers.db")
+    cache = LLM_Cache(path, max_size=10)
+
+    for num in range(10):
+        cache.put(f"key_{num}", f"answer_{num}")
+    cache.put("key_0", "new answer")
+    assert cache.stats()["size"] == count_rows(path) == 10
+    assert cache.get("key_0") == "new answer"
+
+    # При переполнении удаляется сразу пачка давно не использовавшихся записей
+    cache.put("key_10", "answer_10")
+    assert cache.stats()["size"] == count_rows(path) == 9
+    assert cache.get("key_1") is None and cache.get("key_2") is None
+    assert cache.get("key_0") == "new answer" and cache.get("key_10") == "answer_10"
+    cache.close()
+
+    reopened = LLM_Cache(path, max_size=10)
+    assert reopened.stats()["size"] == 9
+    assert reopened.get("key_10") == "answer_10"
+    reopened.close()
@@ -0,0 +1,84 @@
+import hashlib
+import os
+
+import numpy as np
+import pytest
+
+from src.backend.embedding_store import Embedding_Store
+
+
+DIM = 4
+
+
+def make_hash(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def make_vector(num: int) -> np.ndarray:
+    return np.arange(DIM, dtype=np.float32) + num
+
+
+def open_store(path) -> Embedding_Store:
+    return Embedding_Store(str(path), dim=DIM, model_name="model")
+
+
+def assert_stored(store: Embedding_Store, nums: list[int], missing: list[int] = []):
+    found = store.get([make_hash(str(num)) for num in nums + missing])
+    for num, vector in zip(nums, found):
+        np.testing.assert_array_equal(vector, make_vector(num))
+    assert found[len(nums):] == [None] * len(missing)
+
+
+def test_append_and_reopen(tmp_path):
+    store = open_store(tmp_path)
+    assert store.get([make_hash("0")]) == [None]
+
+    # Повторы внутри пачки и уже сохранённые хеши пропускаются
+    store.append([make_hash(str(num)) for num in (3, 1, 3)], [make_vector(num) for num in (3, 1, 3)])
+    store.append([make_hash(str(num)) for num in range(2000)], [make_vector(num) for num in range(2000)])
+    assert len(store) == 2000
+    assert_stored(store, [0, 1, 3, 1999, 1000], missing=[2000, 5000])
+
+    reopened = open_store(tmp_path)
+    assert len(reopened) == 2000
+    assert_stored(reopened, [1999, 3, 0, 1], missing=[2001])
+
+    with pytest.raises(ValueError):
+        Embedding_Store(str(tmp_path), dim=DIM + 1, model_name="model")
+
+
+def test_missing_index_is_rebuilt(tmp_path):
+    store = open_store(tmp_path)
+    store.append([make_hash(str(num)) for num in range(10)], [make_vector(num) for num in range(10)])
+    os.remove(tmp_path / "index_keys.bin")
+
+    assert_stored(open_store(tmp_path), list(range(10)), missing=[10])
+
+
+def test_compact(tmp_path):
+    store = open_store(tmp_path)
+    store.append([make_hash(str(num)) for num in range(100)], [make_vector(num) for num in range(100)])
+
+    store.compact({make_hash(str(num)) for num in range(0, 100, 3)} | {make_hash("unknown")})
+    assert len(store) == 34
+    assert_stored(store, list(range(0, 100, 3)), missing=[1, 2, 98])
+    assert_stored(open_store(tmp_path), list(range(0, 100, 3)), missing=[1, 2, 98])
+
+    # После сжатия хранилище можно пополнять
+    store.append([make_hash(str(num)) for num in (1, 2)], [make_vector(num) for num in (1, 2)])
+    assert_stored(open_store(tmp_path), [0, 1, 2, 99], missing=[4])
+
+
+def test_compact_to_zero_rows(tmp_path):
+    store = open_store(tmp_path)
+    store.append([make_hash(str(num)) for num in range(10)], [make_vector(num) for num in range(10)])
+
+    store.compact(set())
+    assert len(store) == 0
+    assert_stored(store, [], missing=[0, 9])
+
+    reopened = open_store(tmp_path)
+    assert len(reopened) == 0
+    assert_stored(reopened, [], missing=[0])
+    reopened.append([make_hash("5")], [make_vector(5)])
+    assert_stored(open_store(tmp_path), [5], missing=[0])
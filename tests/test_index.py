@@ -0,0 +1,102 @@
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("sentence_transformers")
+
+from src.backend.cache import LRU_Cache, Result_Cache
+from src.backend.index import My_search
+
+
+class Fake_Analyzer:
+    def prepare_text(self, text: str) -> str:
+        return text.lower()
+
+
+class Fake_Model:
+    def encode(self, text):
+        class Vector(list):
+            def tolist(self):
+                return list(self)
+        return Vector([0.0, 1.0])
+
+
+class Fake_Elasticsearch:
+    '''Заглушка клиента Elasticsearch: запоминает вызовы и возвращает
+    два документа, найденных в двух индексах.'''
+    def __init__(self):
+        self.calls = []
+
+    def msearch(self, searches):
+        self.calls.append("msearch")
+        hits = [
+            {"_index": index_name, "_id": doc_id, "_source": {
+                "doc_id": doc_id, "url": f"url_{doc_id}", "summary": f"summary_{doc_id}"
+            }}
+            for doc_id in ("a", "b") for index_name in ("standart_index", "custom_index")
+        ]
+        return {"responses": [{"hits": {"hits": hits}}, {"hits": {"hits": hits}}]}
+
+    def mget(self, docs):
+        self.calls.append("mget")
+        return {"docs": [
+            {"_source": {doc["_source"][0]: f"{doc['_source'][0]}_{doc['_id']}"}} for doc in docs
+        ]}
+
+
+@pytest.fixture
+def search():
+    search = My_search.__new__(My_search)
+    search.es = Fake_Elasticsearch()
+    search.analyzer = Fake_Analyzer()
+    search.maker_embedding = Fake_Model()
+    search.query_embeddings = LRU_Cache(16)
+    search.search_results = Result_Cache(16, 300.0)
+    return search
+
+
+def retrieve(search, with_contexts=True):
+    return search.retrieve("Запрос", ["content"], ["standart_index", "custom_index"], with_contexts=with_contexts)
+
+
+def test_retrieve_contexts(search):
+    documents, contexts, query = retrieve(search)
+
+    assert documents == [("url_a", "summary_a"), ("url_b", "summary_b")]
+    assert contexts == ["content_a", "content_b"]
+    assert query == "запрос"
+    assert search.es.calls == ["msearch", "mget"]
+
+
+def test_cache_hit_makes_no_elasticsearch_calls(search):
+    first = retrieve(search)
+    search.es.calls.clear()
+
+    assert retrieve(search) == first
+    assert search.es.calls == []
+    assert search.search_results.stats()["hits"] == 1
+
+
+def test_contexts_are_fetched_once_for_cached_results(search):
+    assert retrieve(search, with_contexts=False)[1] == []
+    assert search.es.calls == ["msearch"]
+
+    assert retrieve(search)[1] == ["content_a", "content_b"]
+    assert retrieve(search)[1] == ["content_a", "content_b"]
+    assert retrieve(search, with_contexts=False)[1] == []
+    assert search.es.calls == ["msearch", "mget"]
+
+
+def test_indices_are_refreshed_before_invalidation(search):
+    retrieve(search)
+    cache_sizes = []
+    search.es.indices = SimpleNamespace(
+        refresh=lambda index: cache_sizes.append(len(search.search_results.data))
+    )
+
+    search.__invalidate_results__(["custom_index"])
+
+    # Пока индекс не обновлён, кеш не сбрасывается: иначе поиск до refresh
+    # снова сохранил бы в кеш выдачу без новых документов
+    assert cache_sizes == [1]
+    assert search.search_results.stats()["size"] == 0
@@ -0,0 +1,247 @@
+import random
+import re
+import string
+
+import numpy as np
+import pandas as pd
+import pytest
+import spacy
+from spacy.language import Language
+
+from src.backend import processing_text
+from src.backend.processing_text import Prepare_Text
+
+
+# Исходные (посимвольные) реализации, с которыми сверяются текущие
+
+
+def reference_first_is_en(cell: str) -> bool:
+    index_first_en = re.search(r"[a-zA-Z]", cell)
+    index_first_ru = re.search(r"[а-яА-Я]", cell)
+
+    return True if index_first_en and (
+        not (index_first_ru) or
+        index_first_ru and index_first_en.start() < index_first_ru.start()
+    ) else False
+
+
+def reference_split_into_en_and_ru(cell: str) -> list[(bool, str)]:
+    parts = []
+    is_en = reference_first_is_en(cell)
+    part = ""
+    for symb in cell:
+        if is_en == (symb in string.ascii_letters) or not (symb.isalpha()):
+            part += symb
+        else:
+            parts.append((is_en, part))
+            part = symb
+            is_en = not (is_en)
+
+    if part:
+        parts.append((is_en, part))
+
+    return parts
+
+
+def reference_remove_extra_spaces_and_line_breaks(text: str) -> str:
+    processed = ""
+
+    if type(text) != str or len(text) == 0:
+        return ""
+
+    flag = True
+    for symb in text:
+        if flag and (symb == " " or symb == "\n"):
+            processed += " "
+            flag = False
+
+        if symb != " " and symb != "\n":
+            flag = True
+
+        if flag:
+            processed += symb
+
+    return processed.strip()
+
+
+def reference_light_prepare_docs(docs: pd.DataFrame, columns: list[str], num_of_docs: int) -> pd.DataFrame:
+    # Построчный цикл light_prepare_docs (docs - результат pd.read_excel)
+    docs = docs.loc[:num_of_docs, columns]
+    docs = docs.fillna("")
+    docs = docs.astype(str)
+
+    for row in range(num_of_docs):
+        for column in docs.columns:
+            if type(docs.loc[row, column]) == str and len(docs.loc[row, column]) > 0:
+                docs.loc[row, column] = reference_remove_extra_spaces_and_line_breaks(docs.loc[row, column])
+            else:
+                docs.loc[row, column] = ""
+
+    docs = docs.replace(['', ' '], np.nan).dropna(how='all').reset_index(drop=True)
+
+    return docs
+
+
+ALPHABET = (
+    string.ascii_letters + "абвгдеёжзийклмнопрстуфхцчшщъыьэюяАБВГДЕЁЖЗИЙ"
+    + "0123456789 \n\t.,!?-_²½αβΩ€™ßéñ中文"
+)
+
+
+@pytest.fixture(scope="module")
+def analyzer():
+    # Языковые пакеты загружаются лениво и для этих функций не нужны
+    return Prepare_Text(lean=True)
+
+
+def assert_same(analyzer, text):
+    assert analyzer.__first_is_en__(text) == reference_first_is_en(text), repr(text)
+    assert analyzer.__split_into_en_and_ru__(text) == reference_split_into_en_and_ru(text), repr(text)
+    assert (
+        analyzer.__remove_extra_spaces_and_line_breaks__(text)
+        == reference_remove_extra_spaces_and_line_breaks(text)
+    ), repr(text)
+
+
+@pytest.mark.parametrize("text", [
+    "",
+    " ",
+    "\n\n",
+    "   привет   мир  \n\n hello  world \n",
+    "Python и Java",
+    "ёжик in the туман",
+    "123 456",
+    "x²y² и a½",
+    "Δelta и α-beta",
+    "только русский текст",
+    "only english text",
+])
+def test_known_cases(analyzer, text):
+    assert_same(analyzer, text)
+
+
+def test_random_strings(analyzer):
+    generator = random.Random(0)
+    for _ in range(20000):
+        text = "".join(generator.choices(ALPHABET, k=generator.randint(0, 40)))
+        assert_same(analyzer, text)
+
+
+def test_code_points(analyzer):
+    # Каждый символ между английской и русской буквой и наоборот: все
+    # символы BMP и каждый 16-й символ остальных плоскостей
+    code_points = list(range(0x10000)) + list(range(0x10000, 0x110000, 16))
+    for code_point in code_points:
+        if 0xD800 <= code_point <= 0xDFFF:
+            continue
+        symb = chr(code_point)
+        for text in (f"a{symb}б", f"б{symb}a", f"{symb}a б", f"{symb} "):
+            assert_same(analyzer, text)
+
+
+def make_frame(num_of_rows: int, seed: int) -> pd.DataFrame:
+    # Столбцы с пропусками, числами, пустыми и многострочными ячейками
+    generator = random.Random(seed)
+    cells = [
+        np.nan, None, 7, 3.5, "", " ", "\n", "  \n ", "строка",
+        "  две  \n\n строки \n", "text  with\nbreaks", "x  ²  y", "  ",
+    ]
+    frame = pd.DataFrame({
+        column: [generator.choice(cells) for _ in range(num_of_rows)]
+        for column in ("url", "title", "content", "extra")
+    })
+    # Полностью пустые строки (удаляются) и числовой столбец
+    frame.loc[generator.randrange(num_of_rows), ["url", "title", "content"]] = np.nan
+    frame["number"] = [generator.random() if generator.random() > 0.3 else np.nan for _ in range(num_of_rows)]
+
+    return frame
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+@pytest.mark.parametrize("num_of_docs", [0, 1, 5, 29, 30])
+def test_light_prepare_docs(analyzer, monkeypatch, seed, num_of_docs):
+    # При num_of_docs < числа строк .loc[:num_of_docs] берёт на одну строку
+    # больше, и эта последняя строка не очищается: поведение сохраняется
+    frame = make_frame(30, seed)
+    columns = ["url", "title", "content", "number"]
+    monkeypatch.setattr(processing_text.pd, "read_excel", lambda path: frame.copy())
+
+    pd.testing.assert_frame_equal(
+        analyzer.light_prepare_docs("news.xlsx", columns, num_of_docs),
+        reference_light_prepare_docs(frame.copy(), columns, num_of_docs)
+    )
+
+
+@Language.component("toy_lemma")
+def toy_lemma(doc):
+    # Лемма без учёта контекста: нижний регистр без последней буквы
+    for token in doc:
+        token.lemma_ = token.lower_[:-1] if len(token) > 3 else token.lower_
+    return doc
+
+
+def make_toy_analyzer(**kwargs) -> Prepare_Text:
+    # Пустые языковые пакеты SpaCy (токенизатор и стоп-слова) с игрушечной
+    # лемматизацией вместо настоящих моделей
+    analyzer = Prepare_Text(lean=True, **kwargs)
+    for is_en, name in processing_text.MODELS_NAMES.items():
+        nlp = spacy.blank("en" if is_en else "ru")
+        nlp.add_pipe("toy_lemma")
+        analyzer.models[name] = nlp
+    return analyzer
+
+
+CELLS = [
+    "Привет  мир, hello World!\n\nЭто тест test",
+    "",
+    "ёabc где-то там",
+    "Δelta и α-beta",
+    "Python  и  Java\nразработка  ",
+    "  только русский текст  ",
+    "only english text and the stop words",
+    "x²y² и a½, 123 456",
+]
+
+
+@pytest.mark.parametrize("cache", ["none", "memory", "dictionary"])
+def test_prepare_chunk_matches_processing_cell(tmp_path, cache):
+    kwargs = {
+        "none": {},
+        "memory": {"lemma_cache_size": 1000},
+        # Маленький кеш в памяти, чтобы леммы читались из словаря на диске
+        "dictionary": {"lemma_cache_size": 3, "lemma_dictionary_path": str(tmp_path / "lemmas")},
+    }[cache]
+    reference = make_toy_analyzer()
+    analyzer = make_toy_analyzer(**kwargs)
+
+    generator = random.Random(0)
+    docs = pd.DataFrame({
+        column: [generator.choice(CELLS) for _ in range(40)] for column in ("title", "content", "tags")
+    })
+    expected = {
+        column: [reference.__processing_cell__(cell) for cell in docs[column]]
+        for column in ("title", "content")
+    }
+
+    # Второй проход с кешем лемматизирует известные фрагменты по словарю
+    for _ in range(2):
+        prepared = analyzer.prepare_chunk(docs, ["title", "content"])
+        for column in ("title", "content"):
+            assert list(prepared[column]) == expected[column]
+        pd.testing.assert_series_equal(prepared["tags"], docs["tags"])
+
+    if cache != "none":
+        assert analyzer.profile_report()["cached_tokens"] > 0
+        assert [analyzer.prepare_text(cell) for cell in CELLS] == [reference.prepare_text(cell) for cell in CELLS]
+
+
+def test_lemma_dictionary_is_shared(tmp_path):
+    path = str(tmp_path / "lemmas")
+    writer = make_toy_analyzer(lemma_dictionary_path=path)
+    writer.prepare_chunk(pd.DataFrame({"content": CELLS}), ["content"])
+    writer.save_lemma_dictionary()
+
+    reader = make_toy_analyzer(lemma_cache_size=100, lemma_dictionary_path=path, lemma_dictionary_read_only=True)
+    assert [reader.prepare_text(cell) for cell in CELLS] == [writer.prepare_text(cell) for cell in CELLS]
+    # Все словоформы известны по словарю, SpaCy не запускается
+    assert reader.stats["tokens"] == 0
@@ -0,0 +1,135 @@
+import asyncio
+import json
+import threading
+import time
+
+import pytest
+from aiohttp import web
+
+from src.backend import short_answer
+
+
+class Stub_Server:
+    '''Локальная заглушка YandexGPT: отвечает частями (по одному json
+    объекту на строку) с паузой между частями.'''
+    def __init__(self):
+        self.parts = []
+        self.delay = 0.0
+        self.sent = 0
+        self.aborted = threading.Event()
+        self.loop = asyncio.new_event_loop()
+        started = threading.Event()
+        threading.Thread(target=self.__run__, args=(started,), daemon=True).start()
+        started.wait()
+
+    def __run__(self, started):
+        asyncio.set_event_loop(self.loop)
+        app = web.Application()
+        app.router.add_post("/", self.__handle__)
+        self.runner = web.AppRunner(app)
+        self.loop.run_until_complete(self.runner.setup())
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        self.loop.run_until_complete(site.start())
+        self.url = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}/"
+        started.set()
+        self.loop.run_forever()
+
+    async def __handle__(self, request):
+        body = await request.json()
+        if not body["completionOptions"]["stream"]:
+            await asyncio.sleep(self.delay)
+            return web.json_response(self.__chunk__(self.parts[-1]))
+
+        response = web.StreamResponse()
+        await response.prepare(request)
+        try:
+            for part in self.parts:
+                await response.write((json.dumps(self.__chunk__(part)) + "\n").encode())
+                self.sent += 1
+                await asyncio.sleep(self.delay)
+        except (ConnectionError, asyncio.CancelledError):
+            self.aborted.set()
+            raise
+        return response
+
+    def __chunk__(self, text):
+        return {"result": {"alternatives": [{"message": {"role": "assistant", "text": text}}]}}
+
+    def close(self):
+        asyncio.run_coroutine_threadsafe(self.runner.cleanup(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+
+@pytest.fixture
+def server(monkeypatch):
+    stub = Stub_Server()
+    monkeypatch.setattr(short_answer, "yandex_gpt_api_url", stub.url)
+    yield stub
+    short_answer.close()
+    stub.close()
+
+
+def stream(cumulative=True):
+    return short_answer.iterate(
+        short_answer.get_short_answer_stream("промпт", "документ", "вопрос", cumulative=cumulative)
+    )
+
+
+def test_cumulative_chunks(server):
+    server.parts = ["Мо", "Москва", "Москва - столица"]
+    assert list(stream()) == ["Мо", "Москва", "Москва - столица"]
+
+
+def test_incremental_chunks(server):
+    server.parts = ["Мо", "сква", " - столица"]
+    assert list(stream(cumulative=False)) == ["Мо", "Москва", "Москва - столица"]
+
+
+def test_chunk_format_is_not_guessed(server):
+    # Продолжение, начинающееся с уже полученного текста, не считается
+    # полным текстом, а полный текст не дописывается к предыдущему
+    server.parts = ["ха", "ха", "ха!"]
+    assert list(stream(cumulative=False)) == ["ха", "хаха", "хахаха!"]
+    server.parts = ["Ответ", "Ответ: да", "Нет ответа"]
+    assert list(stream()) == ["Ответ", "Ответ: да", "Нет ответа"]
+
+
+def test_stream_error_is_raised_in_caller():
+    async def broken():
+        yield "часть"
+        raise ValueError("ошибка")
+
+    with pytest.raises(ValueError):
+        list(short_answer.iterate(broken()))
+
+
+def test_iterate_cancellation(server):
+    server.parts = [str(num) for num in range(50)]
+    server.delay = 0.05
+
+    start = time.perf_counter()
+    received = []
+    for text in stream():
+        received.append(text)
+        if len(received) == 2:
+            break
+
+    assert time.perf_counter() - start < 1.0
+    # Отмена обхода закрывает соединение, заглушка перестаёт отправлять части
+    assert server.aborted.wait(3.0)
+    assert server.sent < len(server.parts)
+
+
+def test_short_answers_cancellation(server):
+    server.parts = ["ответ"]
+    server.delay = 0.3
+
+    start = time.perf_counter()
+    answers = short_answer.run(short_answer.get_short_answers(
+        "промпт", [f"документ {num}" for num in range(8)], "вопрос", max_concurrency=2,
+        is_cancelled=lambda: time.perf_counter() - start > 0.4
+    ))
+
+    assert time.perf_counter() - start < 1.0
+    assert answers[:2] == ["ответ", "ответ"]
+    assert all(isinstance(answer, asyncio.CancelledError) for answer in answers[2:])